@@ -3,24 +3,42 @@ import re
 import os
 import datetime
 import time
+import weakref
+import tracing
+
+# 启动计时的起点：必须放在导入 Kivy 及其余模块之前，
+# 之后记录的 "import modules" 耗时才包含这些导入
+LAUNCH_STARTED = time.perf_counter()
+
 from kivy.animation import Animation
-import threading
-from kivy.properties import ListProperty
+from kivy.event import EventDispatcher
+from kivy.properties import ListProperty, NumericProperty
 from kivy.app import App
 from kivy.uix.button import Button
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.label import Label
 from kivy.uix.spinner import Spinner, SpinnerOption
-from kivy.uix.textinput import TextInput
 from kivy.uix.screenmanager import ScreenManager, Screen, SlideTransition
 from kivy.graphics import Color, Rectangle, Line, RoundedRectangle
-from kivy.uix.gridlayout import GridLayout
+from kivy.uix.layout import Layout
 from kivy.uix.scrollview import ScrollView
 from kivy.core.window import Window
 from kivy.uix.popup import Popup
 from kivy.uix.behaviors import ButtonBehavior
 from kivy.clock import Clock
+from kivy.logger import Logger
 from get_course import get_course_schedule, get_current_week
+from cache import ResponseCache
+from tasks import TaskExecutor
+from timetable_grid import TimetableGrid
+from texture_cache import texture_cache
+from settings_store import SettingsStore
+from schedule_engine import (
+    ScheduleEngine, DAYS, SEMESTER_WEEKS, CELLS_PER_WEEK, PERIODS_PER_DAY, EMPTY, PERIOD_TIMES,
+    advance_week, clamp_week, week_start
+)
+
+tracing.record('import modules', LAUNCH_STARTED, cat='startup')
 
 # 定义颜色
 PRIMARY_COLOR = [0.20, 0.60, 0.86, 1]      # 主色调蓝色
@@ -35,7 +53,13 @@ POPUP_BACKGROUND_COLOR = [1, 1, 1, 1]      # 弹窗白色背景
 POPUP_CONTENT_COLOR = [1, 1, 1, 1]         # 弹窗内容区域
 
 CREDENTIALS_FILE = './data/credentials.json'      # 保存账号密码的文件
+LEGACY_COURSE_FILE = './data/course.json'         # 旧版课表缓存文件
 FONT_PATH = './font/MapleMono-SC-NF-Regular.ttf'  # 字体文件路径
+# 课表渲染方式：widgets 为每个单元格一个控件，batched 为单控件批量绘制
+GRID_RENDERER = os.environ.get('MYUESTC_RENDERER', 'widgets')
+# 后台刷新失败后的重试间隔（秒），连续失败时逐次加倍，直到上限
+REFRESH_RETRY_DELAY = 30
+REFRESH_RETRY_MAX_DELAY = 600
 
 # 定义字体大小
 BASE_FONT_SIZE = 48
@@ -44,16 +68,30 @@ BUTTON_FONT_SIZE = BASE_FONT_SIZE
 SPINNER_FONT_SIZE = BASE_FONT_SIZE
 POPUP_TITLE_FONT_SIZE = 32
 POPUP_CONTENT_FONT_SIZE = 32
+MIN_CELL_HEIGHT = 480  # 课表单元格最小高度
+
+# CoreLabel 选项中不参与纹理缓存键的项：text 在 markup 时会被改写为带颜色的文字，
+# font_name_r 是渲染时由 font_name 解析出的路径
+TEXTURE_UNKEYED_OPTIONS = ('text', 'font_name_r')
+
+# studyapi 响应缓存，所有界面共享
+response_cache = ResponseCache()
+# 网络和磁盘读写统一在这个线程池中执行，回调派发回主线程
+task_executor = TaskExecutor()
+# 账号等设置只解析一次，之后从内存读取
+settings_store = SettingsStore(CREDENTIALS_FILE)
 
 class FontScaler:
     @staticmethod
-    def get_base_font_size():
+    def get_base_font_size(width=None, height=None):
         # 基于窗口宽度和高度的平均值计算基础字体大小
-        return (Window.width * 0.01 + Window.height * 0.02) / 2
+        width = Window.width if width is None else width
+        height = Window.height if height is None else height
+        return (width * 0.01 + height * 0.02) / 2
     
     @staticmethod
-    def get_font_sizes():
-        base = FontScaler.get_base_font_size()
+    def get_font_sizes(width=None, height=None):
+        base = FontScaler.get_base_font_size(width, height)
         return {
             'base': base,
             'label': base,
@@ -63,6 +101,100 @@ class FontScaler:
             'popup_content': base * 1.1
         }
 
+class LayoutMetrics:
+    """一次窗口尺寸变化后需要的全部尺寸，只计算一次供所有监听者共用"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # 单元格高度，不低于最小高度
+        self.cell_height = max(height * 0.9 / 13, MIN_CELL_HEIGHT)
+        self.time_text_width = width * 0.06
+        self.font_sizes = FontScaler.get_font_sizes(width, height)
+        # 课表单元格的字号随单元格高度变化，但不超过普通标签
+        label = self.font_sizes['label']
+        self.font_sizes['time_cell'] = min(label, self.cell_height * 0.2)
+        self.font_sizes['course_cell'] = min(label, self.cell_height * 0.25)
+
+class FontSizes(EventDispatcher):
+    """
+    按用途共享的字号。
+
+    控件创建时用 bind_widget 登记一次用途，窗口尺寸变化后只需更新这几个
+    属性，由属性变化通知登记过的控件，不必遍历整个控件树。控件以弱引用
+    登记，关闭的弹窗等可以正常回收。
+    """
+    base = NumericProperty(BASE_FONT_SIZE)                    # 输入框
+    label = NumericProperty(LABEL_FONT_SIZE)
+    button = NumericProperty(BUTTON_FONT_SIZE)
+    spinner = NumericProperty(SPINNER_FONT_SIZE)
+    popup_title = NumericProperty(POPUP_TITLE_FONT_SIZE)
+    popup_content = NumericProperty(POPUP_CONTENT_FONT_SIZE)
+    time_cell = NumericProperty(LABEL_FONT_SIZE)              # 课表第一列的节次和时间
+    course_cell = NumericProperty(LABEL_FONT_SIZE)            # 课表表头和课程单元格
+
+    ROLES = ('base', 'label', 'button', 'spinner', 'popup_title', 'popup_content', 'time_cell', 'course_cell')
+
+    def __init__(self, **kwargs):
+        super(FontSizes, self).__init__(**kwargs)
+        self._widgets = {role: weakref.WeakSet() for role in self.ROLES}
+        for role in self.ROLES:
+            self.fbind(role, self._update_widgets, role)
+
+    def bind_widget(self, widget, role):
+        """控件的 font_size 跟随 role 的字号，立即套用当前值"""
+        widget.font_size = getattr(self, role)
+        self._widgets[role].add(widget)
+        return widget
+
+    def _update_widgets(self, role, instance, value):
+        for widget in list(self._widgets[role]):
+            widget.font_size = value
+
+    def apply_metrics(self, metrics):
+        for role, size in metrics.font_sizes.items():
+            setattr(self, role, size)
+
+class ResizeCoordinator:
+    """
+    合并窗口尺寸变化事件。
+
+    拖动窗口或旋转手机时会连续触发大量 size 事件，这里只在事件停止
+    DELAY 秒后计算一次 LayoutMetrics，并按注册顺序交给各个监听者。
+    """
+    DELAY = 0.1
+
+    def __init__(self):
+        self._listeners = []
+        self._trigger = None
+
+    def register(self, callback):
+        if self._trigger is None:
+            self._trigger = Clock.create_trigger(self._apply, self.DELAY)
+            Window.bind(size=self._on_window_size)
+        self._listeners.append(callback)
+
+    def unregister(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _on_window_size(self, window, size):
+        self.schedule()
+
+    def schedule(self):
+        """重新计时，连续的请求只在最后一次之后生效"""
+        if self._trigger is not None:
+            self._trigger.cancel()
+            self._trigger()
+
+    def _apply(self, dt):
+        metrics = LayoutMetrics(Window.width, Window.height)
+        for callback in list(self._listeners):
+            callback(metrics)
+
+resize_coordinator = ResizeCoordinator()
+font_sizes = FontSizes()
+
 class LimitedScrollView(ScrollView):
     def on_touch_move(self, touch):
         if self.collide_point(*touch.pos):
@@ -107,14 +239,13 @@ class CustomPopup(Popup):
         layout = BoxLayout(orientation='vertical', spacing=20, padding=20)
 
         if title_text:
-            self.title_label = Label(
+            self.title_label = font_sizes.bind_widget(Label(
                 text=title_text,
                 font_name=FONT_PATH,
-                font_size=POPUP_TITLE_FONT_SIZE,
                 size_hint=(1, 0.3),
                 halign='center',
                 valign='middle'
-            )
+            ), 'popup_title')
             self.title_label.bind(size=self.title_label.setter('text_size'))
             layout.add_widget(self.title_label)
 
@@ -162,7 +293,7 @@ class CustomSpinnerOption(SpinnerOption):
     def __init__(self, **kwargs):
         super(CustomSpinnerOption, self).__init__(**kwargs)
         self.font_name = FONT_PATH
-        self.font_size = SPINNER_FONT_SIZE
+        font_sizes.bind_widget(self, 'spinner')
         self.original_background_color = self.background_color  # 保存原始颜色
         self.original_size = self.size  # 保存原始大小
 
@@ -189,8 +320,10 @@ class CustomSpinnerOption(SpinnerOption):
 class BorderedLabel(ButtonBehavior, Label):
     background_color = ListProperty([1, 1, 1, 1])
     initial_background_color = ListProperty([1, 1, 1, 1])  # 添加初始化颜色属性
+    span = NumericProperty(1)  # 跨越的节次数，0 表示被上方的合并块覆盖
     row = 0
     col = 0
+    course_key = None  # 课程单元格当前显示的课程代码
 
     def __init__(self, background_color=[1, 1, 1, 1], row=0, col=0, span=1, **kwargs):
         super(BorderedLabel, self).__init__(**kwargs)
@@ -198,9 +331,8 @@ class BorderedLabel(ButtonBehavior, Label):
         self.initial_background_color = background_color  # 设置初始化颜色
         self.row = row
         self.col = col
-        self.span = span  # 新增span属性，用于跨越多个节次
+        self.span = span
         self.bind(pos=self.update_rect, size=self.update_rect, background_color=self.update_background_color)
-        self.bind(on_press=self.on_label_press)  # 绑定点击事件
         self.gradient_steps = 1  # 减少渐变步数
         
         with self.canvas.before:
@@ -219,8 +351,53 @@ class BorderedLabel(ButtonBehavior, Label):
                 y_pos = self.y + (self.height / self.gradient_steps) * i
                 height = self.height / self.gradient_steps
                 setattr(self, f'rect_gradient{i}', RoundedRectangle(pos=(self.x, y_pos), size=(self.width, height), radius=[10]))
+
+            # 边框只在这里创建一次，布局变化时只更新坐标；
+            # 上午/下午/晚上的分隔线由 TimetableLayout 统一绘制
+            self.bottom_border = None
+            self.right_border = None
+            if self.row == 0:  # 第一行
+                Color(0, 0, 0, 1)  # 黑色
+                self.bottom_border = Line(width=2)
+            if self.col == 0:  # 第一列
+                Color(0, 0, 0, 1)  # 黑色
+                self.right_border = Line(width=2)
         self.update_border()
-        Window.bind(size=self.on_window_resize)
+
+    def texture_key(self):
+        """
+        纹理缓存的键：文字、markup 以及内部 CoreLabel 的全部渲染选项
+        （字体、字号、颜色、描边、粗斜体、排版区域等，禁用时颜色已换成 disabled_color）
+        """
+        options = tuple(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in sorted(self._label.options.items()) if name not in TEXTURE_UNKEYED_OPTIONS
+        )
+        return self.text, self.markup, options
+
+    def texture_update(self, *largs):
+        # 渲染结果相同的纹理在单元格和周次之间共享
+        if not self.text.strip():
+            return super(BorderedLabel, self).texture_update(*largs)
+        key = self.texture_key()
+        texture = texture_cache.get(key)
+        if texture is None:
+            super(BorderedLabel, self).texture_update(*largs)
+            texture = self.texture
+            # 空白的 1px 纹理和带 [ref]/[anchor] 的文字不缓存，后者命中时无法还原 refs
+            if texture is None or min(texture.size) <= 1 or self.refs or self.anchors:
+                return
+            # 立即完成光栅化，并让内部的 CoreLabel 下次创建新纹理，
+            # 否则同尺寸的文字会直接覆盖写入这张已缓存的纹理
+            texture.bind()
+            self._label.texture = None
+            texture_cache.put(key, texture)
+            return
+        self.texture = texture
+        self.texture_size = list(texture.size)
+        self.is_shortened = False
+        if self.markup:
+            self.refs, self.anchors = {}, {}
 
     def update_rect(self, *args):
         # 更新所有背景层的位置和大小
@@ -238,63 +415,79 @@ class BorderedLabel(ButtonBehavior, Label):
         
         self.update_border()
 
-    def on_window_resize(self, window, size):
-        self.update_rect()
-
     def update_background_color(self, instance, value):
-        # 更新基础颜色层的颜色
+        # 更新基础颜色层的颜色，边框不受影响
         self.color_base.rgba = value
-        self.update_border()
 
     def update_border(self):
-        # 移除所有现有的边框
-        borders_to_remove = [instr for instr in self.canvas.before.children if isinstance(instr, Line)]
-        for border in borders_to_remove:
-            self.canvas.before.remove(border)
-
-        with self.canvas.before:
-            # 第一行和第一列的边框
-            if self.row == 0:  # 第一行
-                Color(0, 0, 0, 1)  # 黑色
-                Line(points=[
-                    self.x, self.y,  # 左
-                    self.x + self.width, self.y  # 右
-                ], width=2)
+        # 原地更新已有边框的坐标，不创建新的绘图指令
+        if self.bottom_border is not None:
+            self.bottom_border.points = [
+                self.x, self.y,  # 左
+                self.x + self.width, self.y  # 右
+            ]
+        if self.right_border is not None:
+            self.right_border.points = [
+                self.x + self.width, self.y,  # 下
+                self.x + self.width, self.y + self.height  # 上
+            ]
+
+class TimetableLayout(Layout):
+    """
+    按 row / col / span 摆放 BorderedLabel 的课表布局。
+
+    span 大于 1 的单元格向下跨越多个节次，被它覆盖的单元格（span 为 0）
+    缩为零大小，不绘制也不接收触摸。
+    """
+    cols = NumericProperty(8)
+    rows = NumericProperty(13)
+    padding = NumericProperty(10)
+    spacing = NumericProperty(2)
+    cell_height = NumericProperty(100)
 
-            if self.col == 0:  # 第一列
-                Color(0, 0, 0, 1)  # 黑色
-                Line(points=[
-                    self.x + self.width, self.y,  # 下
-                    self.x + self.width, self.y + self.height  # 上
-                ], width=2)
-
-            # 上午/下午/晚上分隔线
-            if self.row in [4, 8]:  # 第4行和第8行后的分隔线
-                Color(0.8, 0.8, 0.8, 1)  # 浅灰色
-                Line(points=[
-                    self.x, self.y,  # 左
-                    self.x + self.width, self.y  # 右
-                ], width=1.5)
-
-    def on_label_press(self, instance):
-        if self.text.strip():
-            course_name = ''.join(self.text.split(' ')[0].split('\n')[0:-1])
-            CourseDetailPopup(course_name=course_name).open()
+    def __init__(self, **kwargs):
+        super(TimetableLayout, self).__init__(**kwargs)
+        with self.canvas.after:
+            Color(0.8, 0.8, 0.8, 1)  # 浅灰色
+            self.separators = [Line(width=1.5) for _ in (4, 8)]  # 第4行和第8行后的分隔线
+        trigger = self._trigger_layout
+        for name in ('pos', 'size', 'cols', 'rows', 'padding', 'spacing', 'cell_height'):
+            self.fbind(name, trigger)
+        for name in ('rows', 'padding', 'spacing', 'cell_height'):
+            self.fbind(name, self._update_height)
+        self._update_height()
+
+    def _update_height(self, *args):
+        self.height = self.rows * self.cell_height + (self.rows - 1) * self.spacing + 2 * self.padding
+
+    def add_widget(self, widget, *args, **kwargs):
+        widget.fbind('span', self._trigger_layout)
+        return super(TimetableLayout, self).add_widget(widget, *args, **kwargs)
+
+    def remove_widget(self, widget, *args, **kwargs):
+        widget.funbind('span', self._trigger_layout)
+        return super(TimetableLayout, self).remove_widget(widget, *args, **kwargs)
+
+    def do_layout(self, *args):
+        w = (self.width - 2 * self.padding - (self.cols - 1) * self.spacing) / self.cols
+        h, spacing = self.cell_height, self.spacing
+        left, top = self.x + self.padding, self.top - self.padding
+        for child in self.children:
+            if child.span <= 0:
+                child.size = (0, 0)
+                child.pos = (left, top)
+                continue
+            height = child.span * h + (child.span - 1) * spacing
+            child.size = (w, height)
+            child.pos = (left + child.col * (w + spacing), top - child.row * (h + spacing) - height)
+        for line, row in zip(self.separators, (4, 8)):
+            y = top - (row + 1) * h - row * spacing
+            line.points = [left, y, self.right - self.padding, y]
 
 class CourseDetailPopup(CustomPopup):
-    def __init__(self, course_name, **kwargs):
-        # 初始化详细信息为默认消息
-        detail = '暂无详细信息'
-        try:
-            # 尝试从JSON文件中加载课程详细信息
-            with open('./data/course_details.json', 'r', encoding='utf-8') as f:
-                course_details = json.load(f)
-            # 获取指定课程的详细信息
-            detail = course_details.get(course_name, '暂无详细信息')
-            if isinstance(detail, dict):
-                detail = detail.get('detail', '暂无详细信息')
-        except:
-            pass  # 如果读取文件失败，保持默认消息
+    def __init__(self, course_name, detail=None, **kwargs):
+        # 详细信息由调用方从内存索引中取出，缺失时显示默认消息
+        detail = detail or '暂无详细信息'
 
         # 创建一个可滚动的视图来显示详细信息
         content = ScrollView(size_hint=(1, 0.8))
@@ -307,7 +500,6 @@ class CourseDetailPopup(CustomPopup):
         detail_label = Label(
             text=detail,
             font_name=FONT_PATH,
-            font_size=POPUP_CONTENT_FONT_SIZE,
             color=LABEL_TEXT_COLOR_LIGHT,
             size_hint_y=None,
             halign='left',
@@ -315,6 +507,7 @@ class CourseDetailPopup(CustomPopup):
             text_size=(self.width * 0.9, None),  # 设置文本宽度为弹窗宽度的90%
             padding=(10, 10)  # 添加内边距以防止文本紧贴边缘
         )
+        font_sizes.bind_widget(detail_label, 'popup_content')
         # 绑定标签的宽度变化以自动调整文本区域
         detail_label.bind(
             width=lambda lb, w: lb.setter('text_size')(lb, (w, None)),
@@ -332,9 +525,9 @@ class CourseDetailPopup(CustomPopup):
             background_normal='',
             background_color=PRIMARY_COLOR,
             color=BUTTON_TEXT_COLOR,
-            font_name=FONT_PATH,
-            font_size=BUTTON_FONT_SIZE
+            font_name=FONT_PATH
         )
+        font_sizes.bind_widget(btn_close, 'button')
         btn_close.bind(on_press=self.dismiss)  # 绑定按钮点击事件以关闭弹窗
 
         # 创建主内容布局，包含详细信息和关闭按钮
@@ -372,17 +565,43 @@ class SwipeScreenManager(ScreenManager):
     def __init__(self, **kwargs):
         super(SwipeScreenManager, self).__init__(**kwargs)
         self._touch_start = None
+        self.screen_order = []  # 页面顺序，包括尚未创建的页面
+        self._factories = {}
+
+    def add_lazy_screen(self, name, factory):
+        """登记一个页面，第一次切换到它时才调用 factory(name=name) 创建"""
+        self.screen_order.append(name)
+        self._factories[name] = factory
+
+    def get_screen(self, name):
+        # 切换页面（按钮或滑动）时 ScreenManager 会先调用 get_screen
+        factory = self._factories.pop(name, None)
+        if factory is not None:
+            self.add_widget(factory(name=name))
+        return super(SwipeScreenManager, self).get_screen(name)
+
+    def has_screen(self, name):
+        return name in self._factories or super(SwipeScreenManager, self).has_screen(name)
 
     def on_touch_down(self, touch):
-        # 检查触摸点是否在按钮或交互式组件上
-        for child in self.walk():
-            if child.collide_point(*touch.pos) and isinstance(child, (Button, ButtonBehavior)):
-                return super(SwipeScreenManager, self).on_touch_down(touch)
-        self._touch_start = touch.x
-        return super(SwipeScreenManager, self).on_touch_down(touch)
+        # 先按正常的自上而下顺序只分发给当前页面；按钮、课表网格和滚动区域
+        # 按下时会抓取触摸，被它们抓取的触摸不作为滑动的起点。ScrollView 会
+        # 先抓取触摸，等 scroll_timeout 之后才转发给其中的单元格，所以从课表
+        # 中开始的拖动也由它决定。只需检查这次触摸的抓取列表，耗时与页面中
+        # 的控件数量无关
+        handled = super(SwipeScreenManager, self).on_touch_down(touch)
+        self._touch_start = None if self.grabbed_by_interactive(touch) else touch.x
+        return handled
+
+    @staticmethod
+    def grabbed_by_interactive(touch):
+        for ref in touch.grab_list:
+            if isinstance(ref(), (ButtonBehavior, TimetableGrid, ScrollView)):
+                return True
+        return False
 
     def on_touch_up(self, touch):
-        if self._touch_start:
+        if self._touch_start is not None:
             dx = touch.x - self._touch_start
             if abs(dx) > 50:  # 判定为滑动
                 if dx < 0:
@@ -393,27 +612,31 @@ class SwipeScreenManager(ScreenManager):
         return super(SwipeScreenManager, self).on_touch_up(touch)
 
     def switch_next(self):
-        current_index = self.screen_names.index(self.current)
-        if current_index < len(self.screen_names) - 1:
+        current_index = self.screen_order.index(self.current)
+        if current_index < len(self.screen_order) - 1:
             self.transition.direction = 'left'  # 设置为左滑动方向
-            self.current = self.screen_names[current_index + 1]
+            self.current = self.screen_order[current_index + 1]
 
     def switch_previous(self):
-        current_index = self.screen_names.index(self.current)
+        current_index = self.screen_order.index(self.current)
         if current_index > 0:
             self.transition.direction = 'right'  # 设置为右滑动方向
-            self.current = self.screen_names[current_index - 1]
+            self.current = self.screen_order[current_index - 1]
 
 class ScheduleScreen(Screen):
     def __init__(self, **kwargs):
         super(ScheduleScreen, self).__init__(**kwargs)
         layout = ColoredBoxLayout(orientation='vertical', bg_color=SECONDARY_COLOR)
-        Window.bind(size=self.on_window_resize)
+        resize_coordinator.register(self.apply_metrics)
 
         query_layout = BoxLayout(orientation='horizontal', size_hint=(1, 0.1), spacing=10, padding=10)
-        self.days = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
-        self.sample_schedule = {day: [''] * 12 for day in self.days}
-        self.operate_data()
+        self.days = DAYS
+        self._refresh_task = None
+        self._refresh_failures = 0      # 连续刷新失败的次数
+        self._refresh_retry_at = 0      # 失败后在这个时间（monotonic）之前不再刷新
+        self._cache_expires_at = 0      # 当前周和课表缓存中较早的过期时间
+        self._snapshot_task = None
+        self._snapshot_generation = 0
         self.color_list = [
             [0.20, 0.60, 0.86, 1],   # 蓝色
             [0.46, 0.80, 0.45, 1],   # 绿色
@@ -448,6 +671,10 @@ class ScheduleScreen(Screen):
             [0.95, 0.20, 0.60, 1],   # 热粉色
             [0.10, 0.60, 0.70, 1],   # 青绿色
         ]
+        # 空单元格的状态，以及当前界面上每个课程单元格显示的 (状态, 跨越节数)
+        self.empty_state = ('', SECONDARY_COLOR, None)
+        self.shown_states = [None] * CELLS_PER_WEEK
+        self.load_cached_data()
             # 添加“上一周”按钮
         btn_prev_week = Button(
             text='上一周',
@@ -458,18 +685,21 @@ class ScheduleScreen(Screen):
             background_color=BUTTON_COLOR,
             color=BUTTON_TEXT_COLOR
         )
+        font_sizes.bind_widget(btn_prev_week, 'button')
         btn_prev_week.bind(on_press=self.prev_week)
      
             # 修改spinner_week的size_hint以适应新增按钮
+        self.week_labels = self.make_week_labels()
         self.spinner_week = Spinner(
-            text=f'第{self.current_week}周 (当前周)',
-            values=[f'第{week}周' + (' (当前周)' if week == self.current_week else '') for week in range(1, 21)],
+            text=self.week_labels[self.outstanding_current_week - 1],
+            values=self.week_labels,
             font_name=FONT_PATH,
                 # 移除固定的字体大小设置
                 # font_size=SPINNER_FONT_SIZE,
             size_hint=(0.6, 1),
             option_cls=CustomSpinnerOption
         )
+        font_sizes.bind_widget(self.spinner_week, 'spinner')
             # 绑定spinner_week的文本变化事件，自动查询
         self.spinner_week.bind(text=self.query_schedule)
 
@@ -483,44 +713,57 @@ class ScheduleScreen(Screen):
             background_color=BUTTON_COLOR,
             color=BUTTON_TEXT_COLOR
         )
+        font_sizes.bind_widget(btn_next_week, 'button')
         btn_next_week.bind(on_press=self.next_week)
 
         query_layout.add_widget(btn_prev_week)
         query_layout.add_widget(self.spinner_week)
         query_layout.add_widget(btn_next_week)
 
-        self.label = Label(
+        self.label = font_sizes.bind_widget(Label(
             text='请选择学期并查询',
             font_name=FONT_PATH,
-            font_size=LABEL_FONT_SIZE,
             color=LABEL_TEXT_COLOR_DARK,
             size_hint=(1, 0.1),
             halign='center',
             valign='middle'
-        )
+        ), 'label')
         self.label.bind(size=self.label.setter('text_size'))
 
         layout.add_widget(query_layout)
         
         scroll_view = LimitedScrollView(size_hint=(1, 0.8))
-        self.table_layout = GridLayout(
-            cols=8, 
-            rows=13, 
-            size_hint_y=None, 
-            padding=10, 
-            spacing=2
-        )
-        self.table_layout.bind(minimum_height=self.table_layout.setter('height'))
 
-        # 设置最小单元格高度
-        self.min_cell_height = 480  # 新增最小高度
+        # 当前周的表头（星期和日期）
+        headers = self.week_headers(self.current_week, self.current_week)
 
-        # 获取当前周的日期
-        current_week_dates = self.get_week_dates(self.current_week)
-        headers = ['时间/星期']
-        for day in self.days:
-            date_str = current_week_dates.get(day, '')
-            headers.append(f'{day}\n{date_str}')
+        row_labels = [f'第{row}节\n{start}\n{end}' for row, (start, end) in enumerate(PERIOD_TIMES, 1)]
+
+        if GRID_RENDERER == 'batched':
+            self.build_batched_grid(headers, row_labels)
+        else:
+            self.build_widget_grid(headers, row_labels)
+        
+        scroll_view.add_widget(self.table_layout)
+        layout.add_widget(scroll_view)
+        self.add_widget(layout)
+                
+        self.show_week(self.outstanding_current_week)
+        self.refresh_in_background()
+
+    @tracing.traced(cat='startup')
+    def build_widget_grid(self, headers, row_labels):
+        """每个单元格一个 BorderedLabel 的网格"""
+        self.table_layout = TimetableLayout(
+            cols=8,
+            rows=13,
+            size_hint_y=None,
+            padding=10,
+            spacing=2,
+            cell_height=self.calculate_cell_height()
+        )
+        # 课程单元格按 星期 × 节次 的顺序保存，与课表索引中一周的布局一致
+        self.course_cells = [None] * CELLS_PER_WEEK
 
         # 初始化标题行并保存引用
         self.header_widgets = []  # 保存标题标签的列表
@@ -538,20 +781,17 @@ class ScheduleScreen(Screen):
                 row=0,
                 col=col
             )
+            # 左上角的“时间/星期”与下方的时间列字号一致
+            font_sizes.bind_widget(header_label, 'time_cell' if col == 0 else 'course_cell')
             self.table_layout.add_widget(header_label)
             self.header_widgets.append(header_label)  # 保存标题标签引用
 
-        courge_time = [
-            '08:30\n09:15','09:20\n10:05','10:20\n11:05','11:10\n11:55',
-            '14:30\n15:15','15:20\n16:05','16:20\n17:05','17:10\n17:55',
-            '19:30\n20:15','20:20\n21:05','21:10\n21:55','22:00\n22:45'
-        ]
-                
         # 修改第一列的创建方式，指定初始背景颜色
+        self.time_labels = []
         for row in range(1, 13):
             # 创建第一列的时间标签，添加文本大小自适应和换行
             time_label = BorderedLabel(
-                text=f'第{row}节\n{courge_time[row-1]}',
+                text=row_labels[row - 1],
                 font_name=FONT_PATH,
                 color=LABEL_TEXT_COLOR_DARK,
                 background_color=SECONDARY_COLOR,  # 指定初始背景颜色
@@ -564,14 +804,13 @@ class ScheduleScreen(Screen):
                 row=row,
                 col=0
             )
-            time_label.bind(
-                width=lambda lb, w: setattr(lb, 'text_size', (lb.width, None)),
-                height=lambda lb, h: self.adjust_time_label_font(lb)
-            )
+            time_label.bind(width=lambda lb, w: setattr(lb, 'text_size', (lb.width, None)))
+            font_sizes.bind_widget(time_label, 'time_cell')
             self.table_layout.add_widget(time_label)
+            self.time_labels.append(time_label)
                     
             for col in range(1, 8): 
-                self.table_layout.add_widget(BorderedLabel(
+                cell = BorderedLabel(
                     text='',
                     font_name=FONT_PATH,
                     color=LABEL_TEXT_COLOR_DARK,
@@ -582,281 +821,302 @@ class ScheduleScreen(Screen):
                     valign='middle',
                     row=row,
                     col=col
-                ))
-        
-        scroll_view.add_widget(self.table_layout)
-        layout.add_widget(scroll_view)
-        self.add_widget(layout)
-                
-        self.query_schedule(None)
-
-    def operate_data(self):
-        with open(CREDENTIALS_FILE, 'r', encoding='utf-8') as f:
-            credentials = json.load(f)
-            username = credentials.get('username', '')
-            current_week = credentials.get('currentweek','')
-            update_week = credentials.get('update_week','')
-        
-        if int(time.strftime('%W')) - int(update_week) > 0:
-            current_week = get_current_week()
-            credentials['currentweek'] = current_week
-            credentials['update_week'] = time.strftime('%W')
-            with open(CREDENTIALS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(credentials, f, ensure_ascii=False, indent=4)
-        
-        self.current_week = current_week
-        self.outstanding_current_week = current_week
-        
-        with open('./data/course.json', 'r', encoding='utf-8') as f:
-            if f.read() == '':
-                course_data = get_course_schedule(username)
-                course_data.append({'username': username, 'update_time': time.time()})
-                with open('./data/course.json', 'w', encoding='utf-8') as f_write:
-                    json.dump(course_data, f_write, ensure_ascii=False, indent=4)
-            else:
-                f.seek(0)
-                course_data = json.load(f)
-                if not course_data or course_data[-1]['username'] != username or time.time() - course_data[-1]['update_time'] > 86400:
-                    course_data = get_course_schedule(username)
-                    course_data.append({'username': username, 'update_time': time.time()})
-                    with open('./data/course.json', 'w', encoding='utf-8') as f_write:
-                        json.dump(course_data, f_write, ensure_ascii=False, indent=4)
-                    
-        self.course_list = []
-        with open('./data/course_details.json', 'r', encoding='utf-8') as f:
-            if f.read() == '':
-                course_details = {}
-                course_details['update_time'] = 0
-                course_details['username'] = username
+                )
+                cell.bind(on_press=self.on_cell_press)  # 绑定点击事件
+                font_sizes.bind_widget(cell, 'course_cell')
+                self.table_layout.add_widget(cell)
+                self.course_cells[(col - 1) * PERIODS_PER_DAY + row - 1] = cell
+
+    @tracing.traced(cat='startup')
+    def build_batched_grid(self, headers, row_labels):
+        """整张课表由一个控件批量绘制"""
+        self.table_layout = TimetableGrid(
+            headers=headers,
+            row_labels=row_labels,
+            background_color=SECONDARY_COLOR,
+            text_color=LABEL_TEXT_COLOR_DARK,
+            font_name=FONT_PATH,
+            cell_height=self.calculate_cell_height(),
+            size_hint_y=None
+        )
+        # 表头、时间列和课程共用一种字号
+        font_sizes.bind_widget(self.table_layout, 'course_cell')
+        self.table_layout.bind(on_cell_press=lambda grid, cell: self.on_cell_press(cell))
+        self.header_widgets = self.table_layout.header_cells
+        self.course_cells = [self.table_layout.cell(day_index, period_index)
+                             for day_index in range(len(DAYS))
+                             for period_index in range(PERIODS_PER_DAY)]
+
+    @tracing.traced(cat='startup')
+    def load_cached_data(self):
+        """只读取本地缓存（允许过期），不访问网络，保证首帧不受网络影响"""
+        credentials = settings_store.all()
+        username = credentials.get('username', '')
+        self.username = username
+        self.import_legacy_cache(username, credentials)
+
+        week_entry = response_cache.get('week', allow_stale=True)
+        schedule_entry = response_cache.get('schedule', username, allow_stale=True)
+        self.update_cache_expiry(week_entry, schedule_entry)
+        # 当前周过期时按经过的周一推算，没有任何缓存时先显示第1周
+        self.current_week = advance_week(week_entry.data, week_entry.fetched_at) if week_entry else 1
+        # 当前周只用于推算日期，显示的周必须是下拉列表中有的周
+        self.outstanding_current_week = clamp_week(self.current_week)
+        # 一次性建立 周 × 星期 × 节次 的课表索引，课程的上课周已合并为位图
+        self.set_engine(ScheduleEngine(schedule_entry.data if schedule_entry else []))
+
+    def set_engine(self, engine):
+        self.engine = engine
+        # 课程 -> 颜色、课次 -> 单元格状态 只在索引变化时计算一次
+        self.course_colors = [self.color_list[course.id % len(self.color_list)] for course in engine.courses]
+        self.session_states = [
+            (session.text, self.course_colors[session.course_id], engine.courses[session.course_id].key)
+            for session in engine.sessions
+        ]
+        self.invalidate_snapshots()
+
+    def invalidate_snapshots(self):
+        """课表或当前周变化后丢弃已算好的各周快照，并在后台重新计算"""
+        self._snapshot_generation += 1
+        generation = self._snapshot_generation
+        self.week_snapshots = {}
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+        self._snapshot_task = task_executor.submit(
+            self.build_week_snapshots, self.engine, self.session_states, self.current_week,
+            on_success=lambda snapshots: self.on_snapshots_ready(generation, snapshots)
+        )
+
+    def on_snapshots_ready(self, generation, snapshots):
+        # 计算期间数据又发生了变化时丢弃过时的结果
+        if generation == self._snapshot_generation:
+            self.week_snapshots = snapshots
+
+    @tracing.traced(cat='background')
+    def build_week_snapshots(self, engine, session_states, current_week):
+        """在工作线程中执行：计算整个学期每一周的快照"""
+        today = datetime.date.today()
+        return {
+            week: self.build_week_snapshot(engine, session_states, current_week, week, today)
+            for week in range(1, SEMESTER_WEEKS + 1)
+        }
+
+    def build_week_snapshot(self, engine, session_states, current_week, week, today=None):
+        """
+        一周的快照 (表头文本, 单元格状态)。
+
+        单元格状态按 星期 × 节次 排列，每格为 ((文本, 背景色, 课程代码), 跨越节数)；
+        同一天连续节次的同一课次合并为一个块，被覆盖的单元格为空、跨越节数为 0。
+        只读取传入的参数，可以在工作线程中调用。
+        """
+        headers = [f'[b]{header}[/b]' for header in self.week_headers(week, current_week, today)]
+        empty_state = self.empty_state
+        spans = engine.week_spans(week)
+        states = []
+        for offset, session_id in enumerate(engine.week_slice(week)):
+            span = spans[offset]
+            if session_id == EMPTY or span == 0:
+                states.append((empty_state, span))
             else:
-                f.seek(0)
-                course_details = json.load(f)
-                if 'username' not in course_details:
-                    course_details['username'] = ''
-                elif 'usename' != course_details['username']:
-                    course_details.clear()
-                    course_details['username'] = ''
-                if 'update_time' not in course_details:
-                    course_details['update_time'] = 0
-        course_data.pop(-1)
-        self.course_data = course_data
-        for course in course_data:
-            course['c_name'] = course['c_name'].replace(' ', '').replace('Ⅱ', 'II').replace('Ⅰ', 'I').replace('Ⅲ', 'III').replace('–', '-')
-            if time.time() - course_details['update_time'] > 86400 or course_details['username'] != username:
-                if course['c_name'] not in course_details:
-                    course_details[course['c_name']] = {}
-                    course_details[course['c_name']]['detail'] =(
-                        f'地点: {course["school"]}{course["room_name"]}\n'
-                        f'教师: {course["teacher"]}\n上课周: '
-                    )
-                    course_details[course['c_name']]['rq'] = course['rq']
-                else:
-                    rq = ''
-                    course_details[course['c_name']]['detail'] =(
-                        f'地点: {course["school"]}{course["room_name"]}\n'
-                        f'教师: {course["teacher"]}\n上课周: '
-                    )
-                    for i in range(len(course['rq'])):
-                        if course['rq'][i] == '1' or course_details[course['c_name']]['rq'][i] == '1':
-                            rq += '1'
-                        else:
-                            rq += '0'
-                    course_details[course['c_name']]['rq'] = rq
-                
-            if course['c_name'] not in self.course_list:
-                self.course_list.append(course['c_name'])
-            if current_week < len(course['rq']) and course['rq'][current_week] == '1':  # 使用整数周数
-                xqj = self.days[int(course['xqj']) - 1]
-                ksjc = int(course['ksjc'])
-                jsjc = int(course['jsjc'])
-                for i in range(ksjc, jsjc + 1):
-                    self.sample_schedule[xqj][i - 1] = self.coursename_add(course['c_name']) + '\n \n' + self.coursename_add(course['room_name'])
-
-        for course in self.course_list:
-            start = 0
-            for i in range(1,len(course_details[course]['rq'])):
-                if course_details[course]['rq'][i] == '1' and course_details[course]['rq'][start] == '1':
-                    continue
-                elif course_details[course]['rq'][i] == '1' and course_details[course]['rq'][start] == '0':
-                    start = i
-                    if '周\n' in course_details[course]['detail']:
-                        course_details[course]['detail'] += ','
-                    course_details[course]['detail'] += f'第{start}'
-                elif course_details[course]['rq'][i] == '0' and course_details[course]['rq'][start] == '1':
-                    if start != i - 1:
-                        course_details[course]['detail'] += f'-{i - 1}周\n'
-                    else:
-                        course_details[course]['detail'] += f'周\n'
-                    start = i
-            if course_details[course]['rq'].endswith('1'):
-                course_details[course]['detail'] += f'第{start}-{len(course_details[course]["rq"])}周\n'
-        
-        if time.time() - course_details['update_time']  > 86400 or username != course_details['username']:
-            course_details['update_time'] = time.time()
-            course_details['username'] = username
-            with open('./data/course_details.json', 'w', encoding='utf-8') as f:
-                json.dump(course_details, f, ensure_ascii=False, indent=4)
-        
-    
+                states.append((session_states[session_id], span))
+        return headers, states
+
+    def update_cache_expiry(self, week_entry, schedule_entry):
+        """记下缓存最早的过期时间，之后判断是否需要刷新只比较时间，不再读取缓存"""
+        self._cache_expires_at = min(entry.expires_at if entry else 0 for entry in (week_entry, schedule_entry))
+
+    def refresh_in_background(self):
+        """后台请求最新数据，完成后回到主线程只修补有变化的单元格"""
+        username = self.username
+        if time.time() < self._cache_expires_at:
+            return  # 缓存都未过期
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        if time.monotonic() < self._refresh_retry_at:
+            return  # 上次刷新失败（例如离线），等退避时间过后再试
+        self._refresh_task = task_executor.submit(
+            self.fetch_latest_data, username,
+            on_success=self.on_data_refreshed,
+            on_error=self.on_refresh_failed
+        )
+
+    @tracing.traced(cat='network')
+    def fetch_latest_data(self, username):
+        """在工作线程中执行：请求过期的接口并建立新的课表索引"""
+        # 已在工作线程中，缓存未命中的接口依次请求；同一个键的并发请求只会发出一次
+        current_week, course_data = response_cache.get_or_fetch_many([
+            ('week', '', get_current_week),
+            ('schedule', username, lambda: get_course_schedule(username))
+        ])
+        engine = ScheduleEngine(course_data)
+        return username, current_week, engine
+
+    def on_refresh_failed(self, error):
+        self._refresh_failures += 1
+        delay = min(REFRESH_RETRY_DELAY * 2 ** (self._refresh_failures - 1), REFRESH_RETRY_MAX_DELAY)
+        self._refresh_retry_at = time.monotonic() + delay
+        Logger.warning(f'ScheduleScreen: 刷新课表失败: {error}，{delay}s 后重试')
+
+    def on_data_refreshed(self, result):
+        username, current_week, engine = result
+        if username != self.username:
+            # 刷新期间切换了账号，重新刷新新账号的数据
+            self.refresh_in_background()
+            return
+
+        self._refresh_failures, self._refresh_retry_at = 0, 0
+        self.update_cache_expiry(response_cache.get('week', allow_stale=True),
+                                 response_cache.get('schedule', username, allow_stale=True))
+        old_current_week = self.current_week
+        self.current_week = current_week
+        if self.outstanding_current_week == clamp_week(old_current_week):
+            self.outstanding_current_week = clamp_week(current_week)
+        # 新的索引和当前周会使所有快照失效，后台重新计算
+        self.set_engine(engine)
+        if current_week != old_current_week:
+            # 当前周变化时表头日期和下拉列表都要更新
+            self.update_week()
+        else:
+            self.populate_table(self.outstanding_current_week)
+
+    def import_legacy_cache(self, username, credentials):
+        """把旧版追加在 course.json 末尾的哨兵记录和 credentials 中的当前周导入缓存"""
+        if response_cache.get('schedule', username, allow_stale=True) is None:
+            try:
+                with open(LEGACY_COURSE_FILE, 'r', encoding='utf-8') as f:
+                    course_data = json.load(f)
+            except (OSError, ValueError):
+                course_data = None
+            if course_data and course_data[-1].get('username') == username and 'update_time' in course_data[-1]:
+                response_cache.put('schedule', username, course_data[:-1], fetched_at=course_data[-1]['update_time'])
+
+        if response_cache.get('week', allow_stale=True) is None:
+            if credentials.get('currentweek') and credentials.get('update_week') == time.strftime('%W'):
+                response_cache.put('week', '', credentials['currentweek'])
+
     def rebuild(self):
-        self.operate_data()
-        self.query_schedule(None)
+        # 账号变化后之前的刷新结果已无意义
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        # 换了账号，之前的失败不再作数
+        self._refresh_failures, self._refresh_retry_at = 0, 0
+        self.load_cached_data()
+        self.update_week()
+        self.refresh_in_background()
     
     def prev_week(self, instance):
         if self.outstanding_current_week > 1:
-            self.outstanding_current_week -= 1
-            self.update_week()
+            self.show_week(self.outstanding_current_week - 1)
             
     def next_week(self, instance):
-        if self.outstanding_current_week < 20:
-            self.outstanding_current_week += 1
-            self.update_week()
-            
+        if self.outstanding_current_week < SEMESTER_WEEKS:
+            self.show_week(self.outstanding_current_week + 1)
+
+    def make_week_labels(self):
+        return [f'第{week}周' + (' (当前周)' if week == self.current_week else '') for week in range(1, SEMESTER_WEEKS + 1)]
+
     def update_week(self):
-        # 更新spinner_week的文本
-        self.spinner_week.text = f'第{self.outstanding_current_week}周'
-        # 更新spinner_week的值列表
-        self.spinner_week.values = [f'第{week}周' + (' (当前周)' if week == self.current_week else '') for week in range(1, 21)]
-        # 调用查询方法刷新表格
-        self.query_schedule(None)
-
-    def get_week_dates(self, week_number):
-        """获取指定周数每一天的日期，格式为MM月DD日"""
-        today = datetime.date.today()
-        current_week_number = self.current_week
-        # 计算目标周与当前周的差值
-        week_diff = week_number - current_week_number
-        # 获取当前周的星期一
-        start_of_current_week = today - datetime.timedelta(days=today.weekday())
-        # 计算目标周的星期一
-        target_start_of_week = start_of_current_week + datetime.timedelta(weeks=week_diff)
-        week_dates = {}
-        for i, day in enumerate(['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']):
-            current_day = target_start_of_week + datetime.timedelta(days=i)
-            date_str = current_day.strftime('%m月%d日')
-            week_dates[day] = date_str
-        return week_dates
+        """当前周变化后更新下拉列表的选项，并重新显示所选的周"""
+        self.week_labels = self.make_week_labels()
+        self.spinner_week.values = self.week_labels
+        self.show_week(self.outstanding_current_week)
+
+    def show_week(self, week):
+        """切换到指定周：同步下拉列表的文本，并应用该周的快照"""
+        week = clamp_week(week)
+        label = self.week_labels[week - 1]
+        if self.spinner_week.text != label:
+            # 文本变化会触发 query_schedule，再回到这里显示该周
+            self.spinner_week.text = label
+            return
+        self.outstanding_current_week = week
+        with tracing.span('show_week', 'ui', week=week):
+            self.populate_table(week)
+
+    def week_headers(self, week, current_week, today=None):
+        """指定周的表头文本，日期格式为MM月DD日"""
+        monday = week_start(week, current_week, today)
+        headers = ['时间/星期']
+        for i, day in enumerate(DAYS):
+            date_str = (monday + datetime.timedelta(days=i)).strftime('%m月%d日')
+            headers.append(f'{day}\n{date_str}')
+        return headers
             
     def calculate_cell_height(self):
         # 增加单元格高度比例
         table_height = Window.height * 0.9  # 从0.8增加到0.9
-        cell_height = max(table_height / 13, self.min_cell_height)  # 使用最小高度
+        cell_height = max(table_height / 13, MIN_CELL_HEIGHT)  # 使用最小高度
         return cell_height
 
-    def update_cell_font_size(self, widget):
-        # 已移除固定字体大小设置
-        if not widget.text:
+    @tracing.traced(cat='ui')
+    def apply_metrics(self, metrics):
+        """窗口尺寸稳定后一次性更新单元格的高度，字号由 font_sizes 统一更新"""
+        # 单元格的位置和高度（含合并块）由表格布局按 cell_height 计算
+        self.table_layout.cell_height = metrics.cell_height
+        if isinstance(self.table_layout, TimetableGrid):
             return
-        lines = len(widget.text.split('\n'))
-        if widget.text.startswith('第') or widget.text == '时间/星期':
-            widget.font_size = widget.height * 0.2 if lines > 1 else widget.height * 0.3
-        else:
-            widget.font_size = widget.height * 0.25 if lines > 1 else widget.height * 0.4
-
-    def adjust_time_label_font(self, label):
-        """调整时间标签的字体大小"""
-        # 计算文本行数
-        lines = len(label.text.split('\n'))
-        # 根据行数和单元格高度计算合适的字体大小
-        max_font_size = label.height * 0.2  # 最大字体大小为单元格高度的20%
-        label.font_size = min(max_font_size, label.height / (lines * 1.5))
-
-    def on_window_resize(self, instance, size):
-        new_height = self.calculate_cell_height()
-        for widget in self.table_layout.children[:]:
-            if isinstance(widget, BorderedLabel):
-                widget.height = new_height
-                # 更新第一列的文本宽度
-                if '第' in widget.text and '\n' in widget.text:
-                    widget.text_size = (Window.width * 0.06, None)  # 调整为一致的宽度比例
-                    self.adjust_time_label_font(widget)
-                else:
-                    self.update_cell_font_size(widget)
+        for widget in self.time_labels:
+            # 更新第一列的文本宽度
+            widget.text_size = (metrics.time_text_width, None)  # 调整为一致的宽度比例
 
     def query_schedule(self, instance, value=None):
             selected_week = self.spinner_week.text
+            if selected_week in self.week_labels:
+                self.show_week(self.week_labels.index(selected_week) + 1)
+                return
             # 提取周数
             match = re.search(r'\d+', selected_week)
-            if match:
-                week_number = int(match.group())
-                self.outstanding_current_week = week_number
-                # 使用 Clock.schedule_once 确保在主线程中执行动画
-                Clock.schedule_once(lambda dt: self.populate_table(week_number))
-    
-    def coursename_add(self, coursename):
-        coursename = [coursename[i:i+4] for i in range(0, len(coursename), 4)]
-        # 使用换行符连接这些组
-        return '\n'.join(coursename)
+            if match and 1 <= int(match.group()) <= SEMESTER_WEEKS:
+                self.show_week(int(match.group()))
     
+    @tracing.traced(cat='ui')
     def populate_table(self, week):
-        # 获取指定周的日期
-        with open(CREDENTIALS_FILE, 'r', encoding='utf-8') as f:
-            credentials = json.load(f)
-            update_week = credentials.get('update_week','')
-        
-        if int(time.strftime('%W')) - int(update_week) > 0:
-            current_week = get_current_week()
-            self.current_week = current_week
-            credentials['currentweek'] = current_week
-            credentials['update_week'] = time.strftime('%W')
-            with open(CREDENTIALS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(credentials, f, ensure_ascii=False, indent=4)
-        
-        week_dates = self.get_week_dates(week)
-        
-        # 更新标题行的文本
-        headers = ['时间/星期']
-        for day in ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']:
-            date_str = week_dates.get(day, '')
-            headers.append(f'{day}\n{date_str}')
-        
+        # 当前周缓存到下周一，过期后在后台刷新，不阻塞界面；
+        # 这里只比较记下的过期时间，切换周次时不读取缓存
+        if time.time() >= self._cache_expires_at:
+            self.refresh_in_background()
+
+        snapshot = self.week_snapshots.get(week)
+        if snapshot is None:
+            # 后台快照还没算完，只同步计算这一周
+            snapshot = self.week_snapshots[week] = self.build_week_snapshot(
+                self.engine, self.session_states, self.current_week, week)
+        headers, states = snapshot
         for header_widget, header_text in zip(self.header_widgets, headers):
-            header_widget.text = f'[b]{header_text}[/b]'
-        
-        # 清空现有内容和样式，仅重置课程单元格
-        for widget in self.table_layout.children:
-            if isinstance(widget, BorderedLabel):
-                if widget.row != 0 and widget.col != 0:
-                    widget.text = ''
-                    widget.background_color = widget.initial_background_color  # 使用初始化的颜色
-                    widget.update_background_color(widget, widget.background_color)  # 调用更新方法
-        
-        self.sample_schedule = {day: [''] * 12 for day in self.days}
-        for course in self.course_data:
-            if week < len(course['rq']) and course['rq'][week] == '1':  # 使用整数周数
-                xqj = self.days[int(course['xqj']) - 1]
-                ksjc = int(course['ksjc'])
-                jsjc = int(course['jsjc'])
-                for i in range(ksjc, jsjc + 1):
-                    self.sample_schedule[xqj][i - 1] = self.coursename_add(course['c_name']) + '\n \n' + self.coursename_add(course['room_name'])
-        
-        # 填充课程信息
-        
-        for day_index, day in enumerate(self.days, 1):
-            courses = self.sample_schedule.get(day, [])
-            for period_index, course in enumerate(courses, 1):
-                if course:
-                    course_name = ''.join(course.split(' ')[0].split('\n')[0:-1])
-                    widget_position = (12 - period_index) * 8 + (7 - day_index)
-                    if widget_position < len(self.table_layout.children):
-                        target_widget = self.table_layout.children[widget_position]
-                        if target_widget.row != 0 and target_widget.col != 0:
-                            target_widget.text = course
-                            # 设置背景颜色并添加多层渐变效果
-                            target_widget.background_color = self.color_list[self.course_list.index(course_name) % len(self.color_list)]
-                            
+            header_widget.text = header_text
+        self.apply_cell_states(states)
+
+    def apply_cell_states(self, states):
+        """
+        把快照中的单元格状态与界面上正在显示的状态逐格比较，只更新内容、
+        颜色或跨越节数有变化的单元格。相邻两周通常只差几门课，切换时只需
+        改动少数单元格。
+        """
+        shown_states = self.shown_states
+        for offset, state in enumerate(states):
+            if state != shown_states[offset]:
+                shown_states[offset] = state
+                widget = self.course_cells[offset]
+                (widget.text, widget.background_color, widget.course_key), widget.span = state
+
+    def on_cell_press(self, widget):
+        """单元格记录了课程代码，打开详情只需查内存中的索引"""
+        course = self.engine.course_by_key(widget.course_key) if widget.course_key else None
+        if course is not None:
+            CourseDetailPopup(course_name=course.name, detail=self.engine.details.get(course.key)).open()
+
 class GradesScreen(Screen):
     def __init__(self, **kwargs):
         super(GradesScreen, self).__init__(**kwargs)
         layout = ColoredBoxLayout(orientation='vertical', bg_color=SECONDARY_COLOR)
-        self.label = Label(
+        self.label = font_sizes.bind_widget(Label(
             text='成绩查询界面',
             font_name=FONT_PATH,
-            font_size=LABEL_FONT_SIZE,
             color=LABEL_TEXT_COLOR_DARK,
             halign='center',
             valign='middle'
-        )
+        ), 'label')
         self.label.bind(size=self.label.setter('text_size'))
         layout.add_widget(self.label)
         self.add_widget(layout)
@@ -865,14 +1125,13 @@ class NotificationsScreen(Screen):
     def __init__(self, **kwargs):
         super(NotificationsScreen, self).__init__(**kwargs)
         layout = ColoredBoxLayout(orientation='vertical', bg_color=SECONDARY_COLOR)
-        self.label = Label(
+        self.label = font_sizes.bind_widget(Label(
             text='通知中心',
             font_name=FONT_PATH,
-            font_size=LABEL_FONT_SIZE,
             color=LABEL_TEXT_COLOR_DARK,
             halign='center',
             valign='middle'
-        )
+        ), 'label')
         self.label.bind(size=self.label.setter('text_size'))
         layout.add_widget(self.label)
         self.add_widget(layout)
@@ -881,68 +1140,54 @@ class NotificationsScreen(Screen):
 class SettingsScreen(Screen):
         def __init__(self, **kwargs):
             super(SettingsScreen, self).__init__(**kwargs)
+            # 设置页面在第一次打开时才创建，TextInput 也推迟到这时导入
+            from kivy.uix.textinput import TextInput
             layout = ColoredBoxLayout(orientation='vertical', bg_color=SECONDARY_COLOR)
-                
-            self.loading_popup = CustomPopup(
-                title_text='保存中...',
-                content_widget=Label(
-                    text='请稍候...',
-                    font_name=FONT_PATH,
-                    font_size=POPUP_CONTENT_FONT_SIZE,
-                    halign='center',
-                    valign='middle'
-                ),
-                size_hint=(0.3, 0.3),
-                auto_dismiss=False
-            )
-            self.username_input = TextInput(
+
+            self.loading_popup = None  # 第一次保存时创建
+            self.username_input = font_sizes.bind_widget(TextInput(
                 hint_text='用户名',
                 font_name=FONT_PATH,
-                font_size=BASE_FONT_SIZE,  # 保持初始字体大小
                 background_color=INPUT_BACKGROUND_COLOR,
                 foreground_color=INPUT_TEXT_COLOR,
                 size_hint=(1, 0.1)
-            )
-            self.password_input = TextInput(
+            ), 'base')
+            self.password_input = font_sizes.bind_widget(TextInput(
                 hint_text='密码',
                 font_name=FONT_PATH,
-                font_size=BASE_FONT_SIZE,  # 保持初始字体大小
                 background_color=INPUT_BACKGROUND_COLOR,
                 foreground_color=INPUT_TEXT_COLOR,
                 password=True,
                 size_hint=(1, 0.1)
-            )
-            save_btn = Button(
+            ), 'base')
+            save_btn = font_sizes.bind_widget(Button(
                 text='保存',
                 font_name=FONT_PATH,
-                font_size=BUTTON_FONT_SIZE,  # 保持初始字体大小
                 background_color=BUTTON_COLOR,
                 color=BUTTON_TEXT_COLOR,
                 size_hint=(1, 0.1)
-            )
+            ), 'button')
             save_btn.bind(on_press=self.save_credentials)
             self.save_btn = save_btn  # 保存按钮引用以便动画使用
 
-            self.status_label = Label(
+            self.status_label = font_sizes.bind_widget(Label(
                 text='',
                 font_name=FONT_PATH,
-                font_size=LABEL_FONT_SIZE,  # 保持初始字体大小
                 color=LABEL_TEXT_COLOR_DARK,
                 size_hint=(1, 0.1),
                 halign='center',
                 valign='middle'
-            )
+            ), 'label')
             self.status_label.bind(size=self.status_label.setter('text_size'))
 
-            layout.add_widget(Label(
+            layout.add_widget(font_sizes.bind_widget(Label(
                 text='设置界面',
                 font_name=FONT_PATH,
-                font_size=LABEL_FONT_SIZE,  # 保持初始字体大小
                 color=LABEL_TEXT_COLOR_DARK,
                 size_hint=(1, 0.1),
                 halign='center',
                 valign='middle'
-            ))
+            ), 'label'))
             layout.add_widget(self.username_input)
             layout.add_widget(self.password_input)
             layout.add_widget(save_btn)
@@ -952,49 +1197,38 @@ class SettingsScreen(Screen):
             self.load_credentials()
 
         def save_credentials(self, instance):
+            if self.loading_popup is None:
+                self.loading_popup = CustomPopup(
+                    title_text='保存中...',
+                    content_widget=font_sizes.bind_widget(Label(
+                        text='请稍候...',
+                        font_name=FONT_PATH,
+                        halign='center',
+                        valign='middle'
+                    ), 'popup_content'),
+                    size_hint=(0.3, 0.3),
+                    auto_dismiss=False
+                )
                 # 显示加载弹窗
             self.loading_popup.open()
             self.save_btn.disabled = True
 
-            # 在线程中执行保存操作
-            threading.Thread(target=self._save_credentials_thread, daemon=True).start()
-            
-        def _save_credentials_thread(self):
-            try:
-                username = self.username_input.text
-                password = self.password_input.text
-                credentials = {'username': username,
-                               'password': password,
-                               'currentweek':get_current_week(),
-                               'update_week':time.strftime('%W')
-                               }
-                    
-                with open(CREDENTIALS_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(credentials, f, ensure_ascii=False, indent=4)
-                status_text = '账号和密码已保存'
-                    
-                app = App.get_running_app()
-                schedule_screen = app.sm.get_screen('schedule')
-                    
-                # 重新初始化 ScheduleScreen
-                def reinitialize_schedule_screen(dt):
-                    schedule_screen.rebuild()
-                    self.status_label.text = status_text
-                    self.loading_popup.dismiss()
-                    self.save_btn.disabled = False
-                    # 不调用 update_font_sizes，以保持设置界面的字体大小不变
-                
-                Clock.schedule_once(reinitialize_schedule_screen)
-            except Exception as e:
-                status_text = f'保存失败: {e}'
-                    
-                def update_ui_error(dt):
-                    self.status_label.text = status_text
-                    # 关闭加载弹窗并恢复按钮状态
-                    self.loading_popup.dismiss()
-                    self.save_btn.disabled = False
-                    
-                Clock.schedule_once(update_ui_error)
+            # 在主线程更新内存中的设置，写文件交给后台线程
+            settings_store.update(username=self.username_input.text,
+                                  password=self.password_input.text)
+            task_executor.submit(
+                settings_store.flush,
+                on_success=self._on_credentials_saved,
+                on_error=self._on_save_failed
+            )
+
+        def _on_credentials_saved(self, result):
+            # 重新初始化 ScheduleScreen
+            App.get_running_app().sm.get_screen('schedule').rebuild()
+            self._update_ui_after_save('账号和密码已保存')
+
+        def _on_save_failed(self, error):
+            self._update_ui_after_save(f'保存失败: {error}')
 
         def _update_ui_after_save(self, status_text):
             self.status_label.text = status_text
@@ -1003,22 +1237,17 @@ class SettingsScreen(Screen):
             self.save_btn.disabled = False
         
         def load_credentials(self):
-            if os.path.exists(CREDENTIALS_FILE):
-                try:
-                    with open(CREDENTIALS_FILE, 'r', encoding='utf-8') as f:
-                        credentials = json.load(f)
-                    self.username_input.text = credentials.get('username', '')
-                    self.password_input.text = credentials.get('password', '')
-                    
-                except Exception as e:
-                    self.status_label.text = f'加载失败: {e}'
+            try:
+                self.username_input.text = settings_store.get('username', '')
+                self.password_input.text = settings_store.get('password', '')
+            except Exception as e:
+                self.status_label.text = f'加载失败: {e}'
                     
 class ScheduleApp(App):
     screens_order = ['schedule', 'grades', 'notifications', 'settings']
 
+    @tracing.traced(cat='startup')
     def build(self):
-        Window.bind(size=self.on_window_resize)
-        
         # 使用自定义的SwipeScreenManager
         self.sm = SwipeScreenManager(transition=SlideTransition())
         self.sm.bind(current=self.on_screen_change)
@@ -1030,9 +1259,12 @@ class ScheduleApp(App):
             ('settings', SettingsScreen)
         ]
 
-        # 添加所有页面
+        # 启动时只创建课表页面，其余页面在第一次切换过去时创建
         for name, screen_class in screens:
-            self.sm.add_widget(screen_class(name=name))
+            self.sm.add_lazy_screen(name, screen_class)
+        self.sm.current = 'schedule'
+        # 字号只在这里随窗口尺寸更新，控件创建时已绑定各自的用途
+        resize_coordinator.register(font_sizes.apply_metrics)
         
         # 初始化 current_index
         self.current_index = 0  # 总是从第一个页面开始
@@ -1070,6 +1302,8 @@ class ScheduleApp(App):
             on_press=lambda x: self.switch_screen(3, 'settings')
         )
 
+        for button in (btn_schedule, btn_grades, btn_notifications, btn_settings):
+            font_sizes.bind_widget(button, 'button')
         nav_layout.add_widget(btn_schedule)
         nav_layout.add_widget(btn_grades)
         nav_layout.add_widget(btn_notifications)
@@ -1079,11 +1313,23 @@ class ScheduleApp(App):
         main_layout.add_widget(self.sm)
         main_layout.add_widget(nav_layout)
 
-        # 延迟调用 update_font_sizes 以确保所有组件已加载
-        Clock.schedule_once(lambda dt: self.update_font_sizes(), 0.1)
+        # 按当前窗口尺寸计算一次布局和字号
+        resize_coordinator.schedule()
 
         return main_layout
 
+    def on_start(self):
+        Clock.schedule_once(self.report_launch_time)
+
+    def report_launch_time(self, dt):
+        Logger.info(f'ScheduleApp: 启动用时 {time.perf_counter() - LAUNCH_STARTED:.3f}s')
+        tracing.instant('first frame', 'startup')
+
+    def on_stop(self):
+        settings_store.flush()
+        task_executor.shutdown()
+        tracing.flush()
+
     def switch_screen(self, index, screen_name):
         if index == self.current_index:
             return
@@ -1097,28 +1343,5 @@ class ScheduleApp(App):
         except ValueError:
             self.current_index = 0
 
-    def on_window_resize(self, instance, size):
-        # 延迟更新字体大小,避免过于频繁刷新
-        Clock.schedule_once(lambda dt: self.update_font_sizes(), 0.1)
-    
-    def update_font_sizes(self):
-        font_sizes = FontScaler.get_font_sizes()
-        
-        # 更新需要的组件
-        for widget in self.walk_widgets():
-            if isinstance(widget, Label):
-                widget.font_size = font_sizes['label']
-            elif isinstance(widget, Button):
-                widget.font_size = font_sizes['button']
-            elif isinstance(widget, Spinner):
-                widget.font_size = font_sizes['spinner']
-            elif isinstance(widget, TextInput):
-                widget.font_size = font_sizes['base']
-
-    def walk_widgets(self):
-        """辅助方法，遍历所有子组件"""
-        for widget in self.root.walk():
-            yield widget
-
 if __name__ == '__main__':
     ScheduleApp().run()
\ No newline at end of file
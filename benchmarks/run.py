@@ -0,0 +1,300 @@
+"""
+课表流水线与网格渲染的无界面基准测试。
+
+对自带的 data/course.json 和不同规模的合成课表，分别用两种网格渲染方式
+测量各项操作的耗时（多次运行取中位数等）、tracemalloc 统计的内存分配，
+以及控件数和画布指令数，结果写成 JSON，可用 --compare 与之前的结果对比。
+
+    python benchmarks/run.py -o before.json
+    python benchmarks/run.py -o after.json --compare before.json
+
+默认使用 Kivy 的 mock GL 后端和 SDL 离屏窗口，不需要显示器和 GPU；
+画布指令只记录不执行，耗时反映的是 Python 端的开销。
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 必须在导入 Kivy 之前设置
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+os.environ.setdefault('KIVY_GL_BACKEND', 'mock')
+os.environ.setdefault('SDL_VIDEODRIVER', 'offscreen')
+# 不限制帧率，Clock.tick() 不会为了等待下一帧而休眠
+os.environ.setdefault('KCFG_GRAPHICS_MAXFPS', '0')
+
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+START_DIR = os.getcwd()
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # 字体、数据等路径相对于仓库根目录
+
+import kivy
+from kivy.clock import Clock
+
+import app
+from cache import ResponseCache
+from schedule_engine import SEMESTER_WEEKS, ScheduleEngine
+from settings_store import SettingsStore
+from texture_cache import texture_cache
+
+from synthetic import DENSITIES, synthetic_schedule
+
+RENDERERS = ('widgets', 'batched')
+DEFAULT_COURSES = (20, 200)
+BUNDLED_DATA = os.path.join('data', 'course.json')
+USERNAME = 'benchmark'
+CURRENT_WEEK = 5
+# resize 依次使用的窗口尺寸：竖屏手机、横屏手机、平板
+WINDOW_SIZES = ((1080, 2340), (2340, 1080), (1600, 2560))
+
+
+def load_bundled():
+    with open(BUNDLED_DATA, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    # 旧版缓存文件末尾带有记录用户名和更新时间的哨兵记录
+    return [entry for entry in data if 'c_name' in entry]
+
+
+def datasets(courses):
+    yield 'course.json', load_bundled()
+    for count in courses:
+        for density in DENSITIES:
+            yield f'{density}-{count}', synthetic_schedule(count, density)
+
+
+def count_instructions(instruction):
+    """递归统计画布中的绘图指令（不含指令组本身），子控件的画布也包含在内"""
+    total = 0
+    groups = [instruction]
+    if getattr(instruction, 'has_before', False):
+        groups.append(instruction.before)
+    if getattr(instruction, 'has_after', False):
+        groups.append(instruction.after)
+    for group in groups:
+        for child in group.children:
+            if hasattr(child, 'children'):
+                total += count_instructions(child)
+            else:
+                total += 1
+    return total
+
+
+def widget_counts(widget):
+    return {
+        'widgets': sum(1 for _ in widget.walk(restrict=True)),
+        'instructions': count_instructions(widget.canvas)
+    }
+
+
+def texture_counts(before):
+    """与 before 时的 texture_cache.stats() 相比，文字纹理缓存新增的命中和未命中次数"""
+    after = texture_cache.stats()
+    return {
+        'texture_hits': after['hits'] - before['hits'],
+        'texture_misses': after['misses'] - before['misses']
+    }
+
+
+def measure(run, repeat):
+    """
+    运行 run 共 repeat 次并记录每次的耗时，再在 tracemalloc 下多运行一次
+    记录内存分配。每次运行后执行一帧 Clock，把布局和文字纹理的更新算在
+    该操作中。
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        Clock.tick()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run()
+    Clock.tick()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'runs': repeat,
+        'min_ms': min(samples),
+        'median_ms': statistics.median(samples),
+        'mean_ms': statistics.mean(samples),
+        'max_ms': max(samples),
+        'alloc_net_kb': (current - before) / 1024,
+        'alloc_peak_kb': (peak - before) / 1024
+    }
+
+
+class Bench:
+    def __init__(self, directory, repeat):
+        self.directory = directory
+        self.repeat = repeat
+        self.results = []
+        self.screens = []
+
+    def record(self, dataset, renderer, operation, stats, counts=None):
+        result = dict(dataset=dataset, renderer=renderer, operation=operation, **stats)
+        if counts:
+            result.update(counts)
+        self.results.append(result)
+        extra = ''.join(f'  {key}={value}' for key, value in (counts or {}).items())
+        print(f'{dataset:<14} {renderer or "-":<8} {operation:<20} '
+              f'{stats["median_ms"]:9.3f} ms  {stats["alloc_peak_kb"]:9.1f} KiB{extra}')
+
+    def use_data(self, data):
+        """把课表放入临时缓存，界面启动时直接读取，不会访问网络"""
+        cache = ResponseCache(os.path.join(self.directory, 'cache'))
+        cache.put('week', '', CURRENT_WEEK)
+        cache.put('schedule', USERNAME, data)
+        store = SettingsStore(os.path.join(self.directory, 'credentials.json'))
+        store.update(username=USERNAME)
+        app.response_cache, app.settings_store = cache, store
+
+    def new_screen(self):
+        texture_cache.clear()
+        screen = app.ScheduleScreen(name='schedule')
+        self.screens.append(screen)
+        return screen
+
+    def release_screens(self):
+        for screen in self.screens:
+            app.resize_coordinator.unregister(screen.apply_metrics)
+            if screen._snapshot_task is not None:
+                screen._snapshot_task.cancel()
+        self.screens = []
+
+    def resize(self, screen, size):
+        """与 ResizeCoordinator 相同：计算一次尺寸，更新布局和共享字号"""
+        metrics = app.LayoutMetrics(*size)
+        screen.apply_metrics(metrics)
+        app.font_sizes.apply_metrics(metrics)
+
+    def run_dataset(self, name, data, renderers):
+        self.record(name, None, 'engine', measure(lambda: ScheduleEngine(data), self.repeat))
+        self.use_data(data)
+
+        for renderer in renderers:
+            app.GRID_RENDERER = renderer
+            # 界面创建：读取缓存、建立索引和网格、显示当前周（纹理缓存为空）
+            before = texture_cache.stats()
+            stats = measure(self.new_screen, self.repeat)
+            screen = self.screens[-1]
+            self.record(name, renderer, 'build_screen', stats, dict(widget_counts(screen), **texture_counts(before)))
+            self.release_screens()
+
+            screen = self.new_screen()
+            screen._snapshot_task.result()
+            Clock.tick()  # 交付后台算好的快照
+            engine, states = screen.engine, screen.session_states
+            self.record(name, renderer, 'week_snapshots', measure(
+                lambda: screen.build_week_snapshots(engine, states, CURRENT_WEEK), self.repeat))
+
+            # 依次切换到整个学期的每一周，每次切换为一个样本
+            weeks = iter(range(1, 10 ** 6))
+            before = texture_cache.stats()
+            stats = measure(lambda: screen.show_week(next(weeks) % SEMESTER_WEEKS + 1),
+                            SEMESTER_WEEKS * self.repeat)
+            self.record(name, renderer, 'show_week', stats, dict(widget_counts(screen), **texture_counts(before)))
+
+            sizes = iter(range(10 ** 6))
+            before = texture_cache.stats()
+            stats = measure(lambda: self.resize(screen, WINDOW_SIZES[next(sizes) % len(WINDOW_SIZES)]),
+                            self.repeat * 3)
+            self.record(name, renderer, 'resize', stats, dict(widget_counts(screen), **texture_counts(before)))
+            self.release_screens()
+
+        engine = ScheduleEngine(data)
+        course = max(engine.courses, key=lambda course: len(engine.details.get(course.key, '')), default=None)
+        if course is not None:
+            popups = []
+            stats = measure(lambda: popups.append(
+                app.CourseDetailPopup(course_name=course.name, detail=engine.details.get(course.key))), self.repeat)
+            self.record(name, None, 'course_detail_popup', stats, widget_counts(popups[-1]))
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, path):
+    """按 (数据集, 渲染方式, 操作) 对比中位耗时和峰值内存"""
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = {(r['dataset'], r['renderer'], r['operation']): r for r in json.load(f)['results']}
+    print(f'\n与 {path} 对比（当前 / 基准）')
+    for result in results:
+        old = baseline.get((result['dataset'], result['renderer'], result['operation']))
+        if old is None:
+            continue
+        time_ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        line = (f'{result["dataset"]:<14} {result["renderer"] or "-":<8} {result["operation"]:<20} '
+                f'{old["median_ms"]:9.3f} -> {result["median_ms"]:9.3f} ms ({time_ratio:5.2f}x)  '
+                f'{old["alloc_peak_kb"]:9.1f} -> {result["alloc_peak_kb"]:9.1f} KiB')
+        if 'instructions' in result and 'instructions' in old:
+            line += f'  指令 {old["instructions"]} -> {result["instructions"]}'
+        if 'texture_misses' in result and 'texture_misses' in old:
+            line += f'  纹理未命中 {old["texture_misses"]} -> {result["texture_misses"]}'
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='课表流水线与网格渲染的无界面基准测试')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='结果文件（默认 benchmark.json）')
+    parser.add_argument('-n', '--courses', type=int, nargs='+', default=list(DEFAULT_COURSES),
+                        help='合成课表的课程数，可给出多个（默认 %(default)s）')
+    parser.add_argument('--repeat', type=int, default=5, help='每项操作的运行次数（默认 5）')
+    parser.add_argument('--renderer', choices=RENDERERS, action='append',
+                        help='只测试指定的渲染方式，可重复给出')
+    parser.add_argument('--compare', metavar='BASELINE', help='与之前保存的结果对比')
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error('--repeat 必须为正数')
+
+    font = app.FONT_PATH if os.path.exists(app.FONT_PATH) else 'Roboto'
+    # 仓库中没有附带字体文件时使用 Kivy 自带的字体
+    app.FONT_PATH = font
+
+    with tempfile.TemporaryDirectory() as directory:
+        bench = Bench(directory, args.repeat)
+        for name, data in datasets(args.courses):
+            bench.run_dataset(name, data, args.renderer or RENDERERS)
+    app.task_executor.shutdown()
+
+    output = {
+        'meta': {
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'kivy': kivy.__version__,
+            'platform': platform.platform(),
+            'gl_backend': os.environ.get('KIVY_GL_BACKEND'),
+            'font': font,
+            'repeat': args.repeat
+        },
+        'results': bench.results
+    }
+    # 命令行中的相对路径相对于运行时的工作目录
+    path = os.path.join(START_DIR, args.output)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f'结果已保存到 {args.output}')
+    if args.compare:
+        compare(bench.results, os.path.join(START_DIR, args.compare))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+本地的 studyapi 替身服务器。
+
+提供与 studyapi 形状相同的 getWeek 和 getWeekClassSchedule 接口，可设置
+响应延迟、出错比例和课表规模，用于离线、可重复地测试重试、缓存和并发
+行为。课表默认为按学号生成的合成课表，也可以用 --data 返回固定的文件。
+
+    python benchmarks/studyapi_server.py --latency 200 --error-rate 0.1 --courses 200
+    MYUESTC_API_URL=http://127.0.0.1:8765/ckd python bulk_export.py ids.txt
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import DENSITIES, synthetic_schedule
+
+PREFIX = '/ckd/'
+ERROR_STATUSES = (500, 502, 503)
+MAX_CACHED_SCHEDULES = 1024   # 缓存的已编码课表数
+
+
+class StudyApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, jitter=0.0, error_rate=0.0, courses=20,
+                 density='dense', data=None, week=1, seed=0, verbose=False):
+        super(StudyApiServer, self).__init__(address, StudyApiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.courses = courses
+        self.density = density
+        self.data = data
+        self.week = week
+        self.verbose = verbose
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._schedules = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}{PREFIX.rstrip("/")}'
+
+    def next_response(self):
+        """为一个请求抽取 (延迟秒数, 注入的错误状态码或 None)，并计数"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            status = None
+            if self._rng.random() < self.error_rate:
+                status = self._rng.choice(ERROR_STATUSES)
+                self.errors += 1
+            return delay, status
+
+    def schedule_payload(self, username):
+        """学号对应的课表 JSON，同一学号每次返回同样的内容"""
+        with self._lock:
+            payload = self._schedules.get(username)
+        if payload is None:
+            data = self.data
+            if data is None:
+                data = synthetic_schedule(self.courses, self.density, seed=zlib.crc32(username.encode('utf-8')))
+            payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            with self._lock:
+                if len(self._schedules) >= MAX_CACHED_SCHEDULES:
+                    self._schedules.clear()
+                self._schedules[username] = payload
+        return payload
+
+
+class StudyApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # 支持长连接，与真实接口一样可复用连接
+
+    def send_json(self, status, payload):
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        endpoint = url.path[len(PREFIX):] if url.path.startswith(PREFIX) else None
+        if endpoint not in ('getWeek', 'getWeekClassSchedule'):
+            self.send_json(404, {'error': f'unknown path: {url.path}'})
+            return
+
+        delay, error_status = self.server.next_response()
+        if delay:
+            time.sleep(delay)
+        if error_status is not None:
+            self.send_json(error_status, {'error': 'injected failure'})
+        elif endpoint == 'getWeek':
+            self.send_json(200, self.server.week)
+        elif 'userId' not in query:
+            self.send_json(400, {'error': 'missing userId'})
+        else:
+            self.send_json(200, self.server.schedule_payload(query['userId'][0]))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super(StudyApiHandler, self).log_message(format, *args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='本地的 studyapi 替身服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='每个响应的延迟（毫秒）')
+    parser.add_argument('--jitter', type=float, default=0, help='延迟的随机浮动范围（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='返回 5xx 的比例（0-1）')
+    parser.add_argument('--courses', type=int, default=20, help='合成课表的课程数，决定响应大小')
+    parser.add_argument('--density', choices=DENSITIES, default='dense')
+    parser.add_argument('--data', help='所有学号都返回这个 JSON 文件中的课表')
+    parser.add_argument('--week', type=int, default=1, help='getWeek 返回的当前周')
+    parser.add_argument('--seed', type=int, default=0, help='延迟和出错的随机种子')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出每个请求')
+    args = parser.parse_args(argv)
+    if not 0 <= args.error_rate <= 1:
+        parser.error('--error-rate 必须在 0 到 1 之间')
+
+    data = None
+    if args.data:
+        with open(args.data, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    server = StudyApiServer((args.host, args.port), args.latency / 1000, args.jitter / 1000, args.error_rate,
+                            args.courses, args.density, data, args.week, args.seed, args.verbose)
+    print(f'studyapi 替身已启动: MYUESTC_API_URL={server.base_url}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    print(f'共 {server.requests} 个请求，注入错误 {server.errors} 个', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
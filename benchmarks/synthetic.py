@@ -0,0 +1,68 @@
+"""
+生成任意规模的合成课表，记录格式与 getWeekClassSchedule 的返回值相同。
+
+dense：每门课两次课、整个学期每周都上；sparse：每门课一次课，只在
+单周、双周、几周或零散的周上课。同样的参数和 seed 总是生成同样的课表。
+"""
+import random
+
+from schedule_engine import DAYS_PER_WEEK, SEMESTER_WEEKS
+from weekmask import to_rq
+
+DENSITIES = ('dense', 'sparse')
+# 常见的上课时段（开始节次, 结束节次）
+BLOCKS = ((1, 2), (3, 4), (5, 6), (7, 8), (9, 10), (11, 12), (3, 5), (6, 8))
+SCHOOLS = ('清水河校区', '沙河校区')
+BUILDINGS = ('品学楼A', '品学楼B', '品学楼C', '立人楼A', '立人楼B', '第二教学楼')
+
+
+def weeks_mask(weeks):
+    mask = 0
+    for week in weeks:
+        mask |= 1 << week
+    return mask
+
+
+def sparse_weeks(rng):
+    kind = rng.randrange(4)
+    if kind == 0:
+        return range(1, SEMESTER_WEEKS + 1, 2)          # 单周
+    if kind == 1:
+        return range(2, SEMESTER_WEEKS + 1, 2)          # 双周
+    if kind == 2:
+        first = rng.randint(1, SEMESTER_WEEKS - 3)
+        return range(first, first + 4)                  # 连续几周
+    return rng.sample(range(1, SEMESTER_WEEKS + 1), 5)  # 零散的几周
+
+
+def synthetic_schedule(courses, density='dense', seed=0):
+    """生成 courses 门课程的课表记录列表"""
+    if density not in DENSITIES:
+        raise ValueError(f'unknown density: {density}')
+    rng = random.Random(seed)
+    entries = []
+    for i in range(courses):
+        code = f'S{i:07d}'
+        name = f'合成课程{i}' + '（实验）' * (i % 3 == 0)
+        teacher = f'教师{rng.randrange(courses)}'
+        school = rng.choice(SCHOOLS)
+        sessions = 2 if density == 'dense' else 1
+        for _ in range(sessions):
+            weeks = range(1, SEMESTER_WEEKS + 1) if density == 'dense' else sparse_weeks(rng)
+            first, last = rng.choice(BLOCKS)
+            entries.append({
+                'kksd': f'{min(weeks)}-{max(weeks)}',
+                'xkkh': f'{code}.01',
+                'xqj': str(rng.randint(1, DAYS_PER_WEEK)),
+                'room_name': f'{rng.choice(BUILDINGS)}{rng.randint(101, 520)}',
+                'ksjc': str(first),
+                'jsjc': str(last),
+                'teacher': teacher,
+                'djz': -rng.randint(1, 64),
+                'school': school,
+                't_name': teacher,
+                'course': code,
+                'c_name': name,
+                'rq': to_rq(weeks_mask(weeks))
+            })
+    return entries
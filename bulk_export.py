@@ -0,0 +1,180 @@
+"""
+批量导出课表。
+
+从文件中逐行读取学号，以有界并发和令牌桶限速请求 studyapi，每完成一个
+学号就把整理后的结果追加为 JSON Lines 中的一行。中断后重新运行同样的
+命令会跳过输出文件中已经成功导出的学号。
+
+    python bulk_export.py ids.txt -o schedules.jsonl -c 4 -r 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from get_course import POOL_SIZE, get_course_schedule
+from schedule_engine import normalize_entry
+
+DEFAULT_OUTPUT = 'schedules.jsonl'
+DEFAULT_RATE = 5.0      # 每秒最多发起的请求数
+PROGRESS_EVERY = 50     # 每完成多少个学号输出一次进度
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 个请求，允许最多 capacity 个的突发"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取走一个令牌，桶空时阻塞到有令牌为止"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+
+def read_ids(path):
+    """逐行读取学号，忽略空行和 # 开头的注释"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            username = line.strip()
+            if username and not username.startswith('#'):
+                yield username
+
+
+def load_done_ids(path):
+    """
+    读取已有输出中成功导出的学号。
+
+    上次中断时可能留下写了一半的最后一行，这样的行会被忽略；若文件不以
+    换行结尾则补上换行，之后追加的记录从新的一行开始。
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'error' not in record and 'username' in record:
+                done.add(record['username'])
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+        else:
+            needs_newline = False
+    if needs_newline:
+        with open(path, 'ab') as f:
+            f.write(b'\n')
+    return done
+
+
+def export_one(username, bucket):
+    """在工作线程中执行：请求一个学号的课表并整理为一条记录"""
+    bucket.acquire()
+    try:
+        course_data = get_course_schedule(username)
+        if not isinstance(course_data, list):
+            raise ValueError(f'unexpected response: {type(course_data).__name__}')
+        return {
+            'username': username,
+            'fetched_at': time.time(),
+            'courses': [normalize_entry(entry) for entry in course_data]
+        }
+    except Exception as e:
+        return {'username': username, 'error': f'{type(e).__name__}: {e}'}
+
+
+def export(ids, output, concurrency=POOL_SIZE, rate=DEFAULT_RATE, log=sys.stderr):
+    """
+    导出 ids 中尚未成功导出的学号，返回 (成功数, 失败数, 跳过数)。
+
+    同时在途的请求不超过 concurrency * 2 个，学号列表按需逐行读取，不会
+    整体载入内存；每条结果写入后立即 flush，中断时最多丢失在途的请求。
+    """
+    done = load_done_ids(output)
+    bucket = TokenBucket(rate)
+    ok = failed = skipped = 0
+    pending = set()
+
+    def report(message):
+        if log is not None:
+            print(message, file=log)
+
+    def collect(futures):
+        nonlocal ok, failed
+        for future in futures:
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            out.flush()
+            if 'error' in record:
+                failed += 1
+                report(f'{record["username"]}: {record["error"]}')
+            else:
+                ok += 1
+            if (ok + failed) % PROGRESS_EVERY == 0:
+                report(f'已完成 {ok} 个，失败 {failed} 个')
+
+    with open(output, 'a', encoding='utf-8') as out, \
+            ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='export') as pool:
+        try:
+            for username in ids:
+                if username in done:
+                    skipped += 1
+                    continue
+                # 同一学号在列表中重复出现时只请求一次
+                done.add(username)
+                pending.add(pool.submit(export_one, username, bucket))
+                if len(pending) >= concurrency * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            finished, pending = wait(pending)
+            collect(finished)
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            raise
+    return ok, failed, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量导出课表为 JSON Lines')
+    parser.add_argument('ids', help='学号文件，每行一个学号')
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help=f'输出文件（默认 {DEFAULT_OUTPUT}）')
+    parser.add_argument('-c', '--concurrency', type=int, default=POOL_SIZE,
+                        help=f'同时进行的请求数，超过连接池大小时多出的连接不会被复用（默认 {POOL_SIZE}）')
+    parser.add_argument('-r', '--rate', type=float, default=DEFAULT_RATE,
+                        help=f'每秒最多发起的请求数（默认 {DEFAULT_RATE:g}）')
+    args = parser.parse_args(argv)
+    if args.concurrency < 1 or args.rate <= 0:
+        parser.error('并发数和速率必须为正数')
+
+    start = time.monotonic()
+    try:
+        ok, failed, skipped = export(read_ids(args.ids), args.output, args.concurrency, args.rate)
+    except KeyboardInterrupt:
+        print('已中断，重新运行相同的命令即可继续', file=sys.stderr)
+        return 130
+    print(f'成功 {ok} 个，失败 {failed} 个，跳过 {skipped} 个，用时 {time.monotonic() - start:.1f}s',
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
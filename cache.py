@@ -0,0 +1,283 @@
+"""
+studyapi 响应缓存。
+
+每个 (接口, 用户) 对应 data/cache 下的一个 JSON 文件，文件中记录
+缓存格式版本、获取时间和过期时间。不同接口使用不同的有效期；同一
+个键的并发请求只会真正发出一次（single-flight）；写入先落到临时
+文件再原子替换，中途退出不会留下半个文件。
+
+设置环境变量 MYUESTC_CACHE_FORMAT=binary（或 binary-zlib）后，课表这类
+由对象组成的列表改存为 snapshot.py 的二进制快照（.bin），读取时映射
+文件、按需解码；其他数据仍然写 JSON。
+"""
+import datetime
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+from snapshot import Snapshot, encode_snapshot, is_record_list
+
+CACHE_DIR = './data/cache'
+CACHE_VERSION = 1
+CACHE_FORMATS = ('json', 'binary', 'binary-zlib')
+CACHE_FORMAT = os.environ.get('MYUESTC_CACHE_FORMAT', 'json')
+
+
+def until_next_week(fetched_at):
+    """当前周在每周一零点变化，缓存到下周一为止"""
+    day = datetime.date.fromtimestamp(fetched_at)
+    next_monday = day + datetime.timedelta(days=7 - day.weekday())
+    return time.mktime(next_monday.timetuple())
+
+
+# 各接口的有效期：秒数，或根据获取时间计算过期时间的函数
+DEFAULT_TTLS = {
+    'schedule': 86400,
+    'week': until_next_week,
+}
+
+
+def atomic_write_bytes(path, data):
+    """先写临时文件再替换，保证读者只会看到完整的旧文件或新文件"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, obj, indent=None):
+    atomic_write_bytes(path, json.dumps(obj, ensure_ascii=False, indent=indent).encode('utf-8'))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class CacheEntry:
+    __slots__ = ('endpoint', 'key', 'data', 'fetched_at', 'expires_at')
+
+    def __init__(self, endpoint, key, data, fetched_at, expires_at):
+        self.endpoint = endpoint
+        self.key = key
+        self.data = data
+        self.fetched_at = fetched_at
+        self.expires_at = expires_at
+
+    def is_fresh(self, now=None):
+        return (time.time() if now is None else now) < self.expires_at
+
+    def close(self):
+        """
+        释放数据占用的资源：二进制快照会解除文件映射，之后不能再读取。
+
+        只用于还没有交给任何调用者的条目；已经交出去的快照由最后一个引用
+        释放时自动解除映射。
+        """
+        if isinstance(self.data, Snapshot):
+            self.data.close()
+
+
+class _Flight:
+    """一次正在进行的请求，后来者等待它的结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.entry
+
+
+class ResponseCache:
+    def __init__(self, directory=CACHE_DIR, ttls=None, version=CACHE_VERSION, format=CACHE_FORMAT):
+        if format not in CACHE_FORMATS:
+            raise ValueError(f'unknown cache format: {format}')
+        self.directory = directory
+        self.format = format
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.version = version
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _path(self, endpoint, key, suffix='.json'):
+        safe_key = re.sub(r'[^0-9A-Za-z_.-]', '_', str(key))
+        name = f'{endpoint}-{safe_key}{suffix}' if safe_key else f'{endpoint}{suffix}'
+        return os.path.join(self.directory, name)
+
+    def _expires_at(self, endpoint, fetched_at):
+        ttl = self.ttls.get(endpoint, 0)
+        if callable(ttl):
+            return ttl(fetched_at)
+        return fetched_at + ttl
+
+    def _load(self, endpoint, key):
+        # 切换格式后另一种格式的旧文件仍可读取，下次写入时再替换
+        loaders = (self._load_json, self._load_snapshot)
+        if self.format != 'json':
+            loaders = loaders[::-1]
+        for load in loaders:
+            entry = load(endpoint, key)
+            if entry is not None:
+                return entry
+        return None
+
+    def _load_json(self, endpoint, key):
+        try:
+            with open(self._path(endpoint, key), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return self._entry_from_record(endpoint, key, record)
+
+    def _load_snapshot(self, endpoint, key):
+        try:
+            snapshot = Snapshot(self._path(endpoint, key, '.bin'))
+        except (OSError, ValueError):
+            return None
+        try:
+            record = dict(snapshot.meta or {}, data=snapshot)
+            entry = self._entry_from_record(endpoint, key, record)
+        except ValueError:
+            entry = None
+        if entry is None:
+            snapshot.close()
+        return entry
+
+    def _entry_from_record(self, endpoint, key, record):
+        if not isinstance(record, dict) or record.get('version') != self.version:
+            return None
+        if record.get('endpoint') != endpoint or record.get('key') != key:
+            return None
+        try:
+            return CacheEntry(endpoint, key, record['data'], record['fetched_at'], record['expires_at'])
+        except KeyError:
+            return None
+
+    def get(self, endpoint, key='', allow_stale=False):
+        """
+        读取缓存，内存中没有时从磁盘加载。
+
+        默认只返回未过期的条目；allow_stale 为 True 时过期条目也会返回。
+        """
+        cache_key = (endpoint, key)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            entry = self._load(endpoint, key)
+            if entry is None:
+                return None
+            with self._lock:
+                # 加载期间其他线程可能已写入更新的条目
+                loaded, entry = entry, self._entries.setdefault(cache_key, entry)
+            if entry is not loaded:
+                loaded.close()
+        if allow_stale or entry.is_fresh():
+            return entry
+        return None
+
+    def put(self, endpoint, key, data, fetched_at=None):
+        """
+        写入缓存。
+
+        被替换的快照不会被主动关闭，之前 get 得到它的调用者仍可继续读取；
+        缓存只丢弃自己的引用，最后一个读者用完后映射随之释放。
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        entry = CacheEntry(endpoint, key, data, fetched_at, self._expires_at(endpoint, fetched_at))
+        meta = {
+            'version': self.version,
+            'endpoint': endpoint,
+            'key': key,
+            'fetched_at': entry.fetched_at,
+            'expires_at': entry.expires_at
+        }
+        json_path, snapshot_path = self._path(endpoint, key), self._path(endpoint, key, '.bin')
+        # 替换文件之前先丢弃缓存对旧快照的引用，没有其他读者时映射随之释放；
+        # Windows 上不能替换或删除仍被映射的文件
+        with self._lock:
+            self._entries.pop((endpoint, key), None)
+        if self.format != 'json' and is_record_list(data):
+            atomic_write_bytes(snapshot_path, encode_snapshot(data, meta, compress=self.format == 'binary-zlib'))
+            _remove(json_path)
+        else:
+            atomic_write_json(json_path, dict(meta, data=data))
+            _remove(snapshot_path)
+        with self._lock:
+            self._entries[(endpoint, key)] = entry
+        return entry
+
+    def invalidate(self, endpoint, key=''):
+        with self._lock:
+            self._entries.pop((endpoint, key), None)
+        _remove(self._path(endpoint, key))
+        _remove(self._path(endpoint, key, '.bin'))
+
+    def fetch(self, endpoint, key, fetcher, force=True):
+        """
+        调用 fetcher 获取数据并写入缓存，返回 CacheEntry。
+
+        同一个键同时只会有一个 fetcher 在运行，其余调用者等待并共享其结果。
+        force 为 False 时，若在等待锁期间已有新鲜条目则直接返回它。
+        """
+        cache_key = (endpoint, key)
+        with self._lock:
+            if not force:
+                entry = self._entries.get(cache_key)
+                if entry is not None and entry.is_fresh():
+                    return entry
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = _Flight()
+        if not leader:
+            return flight.wait()
+        try:
+            flight.entry = self.put(endpoint, key, fetcher())
+            return flight.entry
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(cache_key, None)
+            flight.done.set()
+
+    def get_or_fetch(self, endpoint, key, fetcher):
+        """优先返回新鲜的缓存数据，否则请求并缓存"""
+        entry = self.get(endpoint, key)
+        if entry is None:
+            entry = self.fetch(endpoint, key, fetcher, force=False)
+        return entry.data
+
+    def get_or_fetch_many(self, requests):
+        """
+        批量版本的 get_or_fetch。
+
+        requests 为 [(接口, 键, fetcher), ...]，按输入顺序返回数据。缓存未命中
+        的请求在调用线程中依次发出，不另建线程：调用方本身已在后台线程中
+        （例如 task_executor 的工作线程）。
+        """
+        return [self.get_or_fetch(endpoint, key, fetcher) for endpoint, key, fetcher in requests]
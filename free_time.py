@@ -0,0 +1,214 @@
+"""
+查找一组学生的共同空闲时间。
+
+把每个人的课表展开为 学生 × 周 × 星期 × 节次 的布尔张量（True 表示有课），
+查询时对指定周范围内的所有人一次性求并集：某个时段只要有一个人在某一周
+有课就不是完全空闲。候选时段按冲突的人次、冲突人数、时间先后排序。
+
+    python free_time.py schedules.jsonl --weeks 3-12 --length 2 --days 1-5
+    python free_time.py schedules.jsonl --users group.txt --periods 1-8 --top 5
+
+schedules.jsonl 为 bulk_export.py 的输出。
+"""
+import argparse
+import json
+import sys
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from schedule_engine import (
+    DAYS, DAYS_PER_WEEK, PERIOD_TIMES, PERIODS_PER_DAY, RQ_LENGTH, SEMESTER_WEEKS, normalize_entry
+)
+from weekmask import parse_rq
+
+DEFAULT_LENGTH = 2   # 默认查找连续两节课的空闲时段
+DEFAULT_TOP = 10
+MAX_WEEKS = RQ_LENGTH - 1   # rq 的第 0 位不对应任何周
+WEEK_BITS = (1 << RQ_LENGTH) - 1
+
+
+class FreeSlot:
+    """一个候选时段：某个星期几的连续若干节"""
+    __slots__ = ('day', 'first_period', 'last_period', 'free_weeks', 'weeks', 'busy_users', 'conflicts')
+
+    def __init__(self, day, first_period, last_period, free_weeks, weeks, busy_users, conflicts):
+        self.day = day
+        self.first_period = first_period
+        self.last_period = last_period
+        self.free_weeks = free_weeks    # 所有人都空闲的周数
+        self.weeks = weeks              # 查询的总周数
+        self.busy_users = busy_users    # 至少有一周有课的人数
+        self.conflicts = conflicts      # 有课的 (人, 周) 数
+
+    @property
+    def start(self):
+        return PERIOD_TIMES[self.first_period - 1][0]
+
+    @property
+    def end(self):
+        return PERIOD_TIMES[self.last_period - 1][1]
+
+    def to_dict(self):
+        return {
+            'day': self.day,
+            'first_period': self.first_period,
+            'last_period': self.last_period,
+            'start': self.start,
+            'end': self.end,
+            'free_weeks': self.free_weeks,
+            'weeks': self.weeks,
+            'busy_users': self.busy_users,
+            'conflicts': self.conflicts
+        }
+
+    def __str__(self):
+        when = f'{DAYS[self.day - 1]} 第{self.first_period}-{self.last_period}节 {self.start}-{self.end}'
+        if not self.conflicts:
+            return f'{when}  全部空闲'
+        return (f'{when}  {self.free_weeks}/{self.weeks} 周全部空闲，'
+                f'{self.busy_users} 人有冲突（共 {self.conflicts} 人次）')
+
+
+def build_busy(schedules, weeks=SEMESTER_WEEKS):
+    """
+    schedules 为 [(学号, 上课记录列表), ...]，记录可以是接口原样返回的，
+    也可以是 normalize_entry 整理后的。返回 (学号列表, busy)，busy 的形状为
+    (人数, weeks, 7, 12)，busy[i, w - 1, d - 1, p - 1] 表示第 i 人第 w 周
+    星期 d 第 p 节有课。
+    """
+    if not 1 <= weeks <= MAX_WEEKS:
+        raise ValueError(f'weeks must be between 1 and {MAX_WEEKS}')
+    usernames = []
+    users, masks, days, firsts, lasts = [], [], [], [], []
+    for username, entries in schedules:
+        index = len(usernames)
+        usernames.append(username)
+        for entry in entries:
+            if 'first_period' not in entry:
+                if 'c_name' not in entry:
+                    continue  # 旧版缓存末尾的哨兵记录
+                entry = normalize_entry(entry)
+            day, first, last = entry['day'], entry['first_period'], entry['last_period']
+            if day is None or first is None or last is None:
+                continue
+            if not (1 <= day <= DAYS_PER_WEEK and 1 <= first <= last <= PERIODS_PER_DAY):
+                continue
+            mask = parse_rq(entry['rq']) & WEEK_BITS
+            if mask:
+                users.append(index)
+                masks.append(mask)
+                days.append(day - 1)
+                firsts.append(first)
+                lasts.append(last)
+
+    busy = np.zeros((len(usernames), weeks, DAYS_PER_WEEK, PERIODS_PER_DAY), dtype=bool)
+    if not users:
+        return usernames, busy
+    # 每条记录展开为 周 × 节次 的布尔矩阵，再按 (人, 星期) 合并到张量中
+    masks = np.array(masks, dtype=np.uint64)
+    week_bits = ((masks[:, None] >> np.arange(1, weeks + 1, dtype=np.uint64)) & np.uint64(1)).astype(bool)
+    periods = np.arange(1, PERIODS_PER_DAY + 1)
+    period_bits = (periods >= np.array(firsts)[:, None]) & (periods <= np.array(lasts)[:, None])
+    cells = week_bits[:, :, None] & period_bits[:, None, :]
+    # 同一个人同一天可能有多条记录，必须累积而不能直接赋值
+    np.logical_or.at(busy, (np.array(users), slice(None), np.array(days)), cells)
+    return usernames, busy
+
+
+def find_free_slots(busy, first_week=1, last_week=None, length=DEFAULT_LENGTH, days=None, periods=None):
+    """
+    在 first_week 到 last_week（含）内查找连续 length 节的时段，按冲突的
+    人次、冲突人数、星期和节次排序，返回 FreeSlot 列表。
+
+    days 为允许的星期几（1-7），periods 为允许的节次范围 (开始, 结束)。
+    """
+    last_week = busy.shape[1] if last_week is None else min(last_week, busy.shape[1])
+    first_period, last_period = periods or (1, PERIODS_PER_DAY)
+    last_period = min(last_period, PERIODS_PER_DAY)
+    if not (1 <= first_week <= last_week and 1 <= first_period and last_period - first_period + 1 >= length >= 1):
+        return []
+    weeks = last_week - first_week + 1
+    selected = busy[:, first_week - 1:last_week, :, first_period - 1:last_period]
+    # 每个 length 节的窗口中任意一节有课即算冲突：(人, 周, 星期, 起始节次)
+    windows = sliding_window_view(selected, length, axis=3).any(axis=-1)
+    conflicts = windows.sum(axis=(0, 1))
+    busy_users = windows.any(axis=1).sum(axis=0)
+    free_weeks = weeks - windows.any(axis=0).sum(axis=0)
+
+    day_index, start_index = np.meshgrid(np.arange(DAYS_PER_WEEK), np.arange(windows.shape[3]), indexing='ij')
+    allowed = np.ones(day_index.shape, dtype=bool)
+    if days is not None:
+        allowed &= np.isin(day_index + 1, list(days))
+    day_index, start_index = day_index[allowed], start_index[allowed]
+    order = np.lexsort((start_index, day_index, busy_users[allowed], conflicts[allowed]))
+
+    slots = []
+    for i in order:
+        day, start = int(day_index[i]), int(start_index[i])
+        first = first_period + start
+        slots.append(FreeSlot(day + 1, first, first + length - 1, int(free_weeks[day, start]), weeks,
+                              int(busy_users[day, start]), int(conflicts[day, start])))
+    return slots
+
+
+def parse_range(text):
+    """解析 "3-12" 或 "5" 形式的范围"""
+    try:
+        first, _, last = text.partition('-')
+        first = int(first)
+        last = int(last) if last else first
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'无效的范围: {text}')
+    if first > last:
+        raise argparse.ArgumentTypeError(f'无效的范围: {text}')
+    return first, last
+
+
+def main(argv=None):
+    from bulk_export import read_ids
+    from ics_export import iter_jsonl
+
+    parser = argparse.ArgumentParser(description='查找一组学生的共同空闲时间')
+    parser.add_argument('input', help='bulk_export.py 输出的 JSON Lines 文件')
+    parser.add_argument('--users', help='只统计这个文件中的学号（每行一个），默认统计全部')
+    parser.add_argument('--weeks', type=parse_range, default=(1, SEMESTER_WEEKS),
+                        help=f'周范围，例如 3-12（默认 1-{SEMESTER_WEEKS}）')
+    parser.add_argument('--length', type=int, default=DEFAULT_LENGTH, help=f'连续的节数（默认 {DEFAULT_LENGTH}）')
+    parser.add_argument('--days', type=parse_range, help='星期范围，例如 1-5 表示工作日')
+    parser.add_argument('--periods', type=parse_range, help='节次范围，例如 1-8 表示不考虑晚上')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help=f'输出的时段数（默认 {DEFAULT_TOP}）')
+    parser.add_argument('--json', action='store_true', help='输出 JSON')
+    args = parser.parse_args(argv)
+    if args.weeks[0] < 1 or args.weeks[1] > MAX_WEEKS:
+        parser.error(f'周范围必须在 1-{MAX_WEEKS} 之内')
+    if args.length < 1:
+        parser.error('--length 必须为正数')
+
+    cohort = set(read_ids(args.users)) if args.users else None
+    schedules = [(username, courses) for username, courses in iter_jsonl(args.input)
+                 if cohort is None or username in cohort]
+    if cohort is not None:
+        missing = cohort - {username for username, _ in schedules}
+        if missing:
+            print(f'{len(missing)} 个学号没有课表数据，未参与统计', file=sys.stderr)
+    if not schedules:
+        parser.error('没有可用的课表数据')
+
+    usernames, busy = build_busy(schedules, max(SEMESTER_WEEKS, args.weeks[1]))
+    days = range(args.days[0], args.days[1] + 1) if args.days else None
+    slots = find_free_slots(busy, args.weeks[0], args.weeks[1], args.length, days, args.periods)[:args.top]
+
+    if args.json:
+        json.dump({'users': len(usernames), 'weeks': list(args.weeks), 'slots': [slot.to_dict() for slot in slots]},
+                  sys.stdout, ensure_ascii=False, indent=4)
+        sys.stdout.write('\n')
+    else:
+        print(f'{len(usernames)} 人，第{args.weeks[0]}-{args.weeks[1]}周：')
+        for slot in slots:
+            print(slot)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
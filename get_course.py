@@ -1,11 +1,143 @@
-import requests
-
-def get_course_schedule(username):
-    url = f'https://studyapi.uestc.edu.cn/ckd/getWeekClassSchedule?userId={username}'
-    response = requests.get(url)
-    return response.json()
-
-def get_current_week():
-    url = 'https://studyapi.uestc.edu.cn/ckd/getWeek'
-    response = requests.get(url)
-    return response.json()
\ No newline at end of file
+"""
+studyapi 接口。
+
+请求经由可替换的传输层发出，环境变量 MYUESTC_TRANSPORT 选择传输方式：
+
+    http（默认）      直接请求 BASE_URL
+    record:目录       正常请求，并把每个响应保存到目录中
+    replay:目录       不访问网络，只返回之前保存的响应
+
+MYUESTC_API_URL 可把 BASE_URL 指向本地的替身服务器
+（benchmarks/studyapi_server.py），离线测试重试、缓存和并发行为。
+"""
+import json
+import os
+import re
+import threading
+
+import tracing
+from cache import atomic_write_json
+
+BASE_URL = os.environ.get('MYUESTC_API_URL', 'https://studyapi.uestc.edu.cn/ckd').rstrip('/')
+TRANSPORT = os.environ.get('MYUESTC_TRANSPORT', 'http')
+CONNECT_TIMEOUT = 5      # 建立连接的超时时间（秒）
+READ_TIMEOUT = 15        # 等待响应的超时时间（秒）
+MAX_RETRIES = 3          # 连接失败或 5xx 时的最大重试次数
+BACKOFF_FACTOR = 0.5     # 重试间隔 0.5s, 1s, 2s ...
+POOL_SIZE = 4            # 每个主机保持的长连接数
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """返回共享的 requests.Session，复用连接以避免每次请求都重新握手"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests 导入较慢，推迟到第一次请求时（通常在后台线程中）再导入
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET'])
+            )
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+        return _session
+
+
+class HttpTransport:
+    """通过共享的 requests.Session 请求 studyapi"""
+
+    def __init__(self, base_url=None):
+        self.base_url = base_url or BASE_URL
+
+    def get_json(self, path, params=None):
+        response = get_session().get(f'{self.base_url}/{path}', params=params,
+                                     timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        response.raise_for_status()
+        return response.json()
+
+
+def recording_name(path, params=None):
+    """接口和参数对应的录制文件名，例如 getWeekClassSchedule-userId=2023.json"""
+    query = '&'.join(f'{key}={value}' for key, value in sorted((params or {}).items()))
+    name = f'{path}-{query}' if query else path
+    return re.sub(r'[^0-9A-Za-z_.=-]', '_', name) + '.json'
+
+
+class RecordingTransport:
+    """转发请求，并把每个成功的响应写入 directory，供 ReplayTransport 回放"""
+
+    def __init__(self, directory, inner=None):
+        self.directory = directory
+        self.inner = inner or HttpTransport()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_json(self, path, params=None):
+        data = self.inner.get_json(path, params)
+        record = {'path': path, 'params': params or {}, 'data': data}
+        atomic_write_json(os.path.join(self.directory, recording_name(path, params)), record, indent=4)
+        return data
+
+
+class ReplayTransport:
+    """只从 directory 读取录制的响应，没有录制时抛出 LookupError"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def get_json(self, path, params=None):
+        name = recording_name(path, params)
+        try:
+            with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                return json.load(f)['data']
+        except FileNotFoundError:
+            raise LookupError(f'no recorded response for {path} {params or {}} in {self.directory}')
+
+
+def make_transport(spec):
+    """按 MYUESTC_TRANSPORT 的格式创建传输层"""
+    kind, _, directory = spec.partition(':')
+    if kind == 'http' and not directory:
+        return HttpTransport()
+    if kind == 'record' and directory:
+        return RecordingTransport(directory)
+    if kind == 'replay' and directory:
+        return ReplayTransport(directory)
+    raise ValueError(f'unknown transport: {spec!r} (expected http, record:DIR or replay:DIR)')
+
+
+_transport = make_transport(TRANSPORT)
+
+
+def get_transport():
+    return _transport
+
+
+def set_transport(transport):
+    """替换全局传输层，返回原来的传输层以便恢复"""
+    global _transport
+    previous, _transport = _transport, transport
+    return previous
+
+
+def _get_json(path, params=None):
+    with tracing.span(f'GET {path}', 'network'):
+        return _transport.get_json(path, params)
+
+
+def get_course_schedule(username):
+    return _get_json('getWeekClassSchedule', {'userId': username})
+
+
+def get_current_week():
+    return _get_json('getWeek')
@@ -0,0 +1,256 @@
+"""
+把课表导出为 iCalendar (.ics) 文件。
+
+同一门课在同一时间、同一地点的所有上课周合并为一个每周重复的事件
+（RRULE），单双周用 INTERVAL=2 表示，区间内不上课的周用 EXDATE 排除，
+不必为每一次课单独写一个 VEVENT。事件由生成器逐行产出并直接写入文件。
+
+    python ics_export.py 2023010901001 -o schedule.ics
+    python ics_export.py --jsonl schedules.jsonl -o calendars/
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+
+from schedule_engine import PERIOD_TIMES, SEMESTER_WEEKS, normalize_entry, week_start
+from weekmask import has_week, iter_weeks, parse_rq
+
+TZID = 'Asia/Shanghai'
+PRODID = '-//MyUestc//Schedule Export//ZH'
+MAX_LINE_OCTETS = 75   # RFC 5545 规定每行最多 75 个字节，超出部分折行
+# --jsonl 时学号直接用作文件名，只接受这些字符，避免 / 或 .. 写到输出目录之外
+USERNAME_PATTERN = re.compile(r'[0-9A-Za-z_-]+')
+
+VTIMEZONE = [
+    'BEGIN:VTIMEZONE',
+    f'TZID:{TZID}',
+    'BEGIN:STANDARD',
+    'DTSTART:19700101T000000',
+    'TZOFFSETFROM:+0800',
+    'TZOFFSETTO:+0800',
+    'TZNAME:CST',
+    'END:STANDARD',
+    'END:VTIMEZONE',
+]
+
+
+def escape_text(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def fold_line(line):
+    """按 UTF-8 字节数折行，不会把一个多字节字符拆开"""
+    if len(line.encode('utf-8')) <= MAX_LINE_OCTETS:
+        return line
+    parts = []
+    current, size, limit = [], 0, MAX_LINE_OCTETS
+    for char in line:
+        width = len(char.encode('utf-8'))
+        if size + width > limit:
+            parts.append(''.join(current))
+            # 续行以一个空格开头，空格占一个字节
+            current, size, limit = [], 0, MAX_LINE_OCTETS - 1
+        current.append(char)
+        size += width
+    parts.append(''.join(current))
+    return '\r\n '.join(parts)
+
+
+def format_local(day, clock):
+    hour, minute = clock.split(':')
+    return f'{day:%Y%m%d}T{hour}{minute}00'
+
+
+def merge_entries(entries):
+    """
+    合并课程、星期、节次、地点和教师都相同的记录的上课周。
+
+    entries 为 normalize_entry 整理后的记录，返回 {键: (记录, 上课周位图)}，
+    保持首次出现的顺序。
+    """
+    merged = {}
+    for entry in entries:
+        if entry['day'] is None or entry['first_period'] is None or entry['last_period'] is None:
+            continue
+        key = (entry['course'], entry['day'], entry['first_period'], entry['last_period'],
+               entry['room'], entry['teacher'])
+        weeks = parse_rq(entry['rq'])
+        if key in merged:
+            kept, mask = merged[key]
+            merged[key] = (kept, mask | weeks)
+        else:
+            merged[key] = (entry, weeks)
+    return merged
+
+
+def event_digest(key):
+    """
+    由合并键（课程、星期、节次、地点、教师）生成稳定的摘要，用于 UID。
+    同一门课在不同地点或由不同教师上课时 UID 不同，上课周变化时 UID 不变
+    """
+    text = json.dumps(key, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def recurrence(mask, max_week=SEMESTER_WEEKS):
+    """
+    把上课周位图表示为 (首周, 间隔, 次数, 排除的周)。
+
+    间隔取相邻上课周之差的最大公约数，单双周课程因此不需要任何排除项。
+    """
+    weeks = [week for week in iter_weeks(mask) if 1 <= week <= max_week]
+    if not weeks:
+        return None
+    interval = 0
+    for previous, week in zip(weeks, weeks[1:]):
+        interval = math.gcd(interval, week - previous)
+    interval = interval or 1
+    count = (weeks[-1] - weeks[0]) // interval + 1
+    excluded = [week for week in range(weeks[0], weeks[-1] + 1, interval) if not has_week(mask, week)]
+    return weeks[0], interval, count, excluded
+
+
+def iter_events(entries, week1, uid_prefix='', dtstamp=None, max_week=SEMESTER_WEEKS):
+    """逐个产出 VEVENT 的各行；week1 为第1周星期一的日期"""
+    dtstamp = dtstamp or datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    for key, (entry, mask) in merge_entries(entries).items():
+        day, first, last = entry['day'], entry['first_period'], entry['last_period']
+        if not (1 <= day <= 7 and 1 <= first <= last <= len(PERIOD_TIMES)):
+            continue
+        rule = recurrence(mask, max_week)
+        if rule is None:
+            continue
+        first_week, interval, count, excluded = rule
+        start_day = week1 + datetime.timedelta(weeks=first_week - 1, days=day - 1)
+        start_clock, end_clock = PERIOD_TIMES[first - 1][0], PERIOD_TIMES[last - 1][1]
+
+        yield 'BEGIN:VEVENT'
+        yield f'UID:{uid_prefix}{entry["course"]}-{event_digest(key)}@myuestc'
+        yield f'DTSTAMP:{dtstamp}'
+        yield f'DTSTART;TZID={TZID}:{format_local(start_day, start_clock)}'
+        yield f'DTEND;TZID={TZID}:{format_local(start_day, end_clock)}'
+        rrule = f'RRULE:FREQ=WEEKLY;COUNT={count}'
+        yield rrule + (f';INTERVAL={interval}' if interval > 1 else '')
+        if excluded:
+            dates = [format_local(start_day + datetime.timedelta(weeks=week - first_week), start_clock)
+                     for week in excluded]
+            yield f'EXDATE;TZID={TZID}:' + ','.join(dates)
+        yield f'SUMMARY:{escape_text(entry["name"])}'
+        location = f'{entry["school"]}{entry["room"]}'
+        if location:
+            yield f'LOCATION:{escape_text(location)}'
+        description = f'第{first}-{last}节'
+        if entry['teacher']:
+            description += f'\n教师: {entry["teacher"]}'
+        yield f'DESCRIPTION:{escape_text(description)}'
+        yield 'END:VEVENT'
+
+
+def iter_calendar(entries, week1, name='课表', uid_prefix='', max_week=SEMESTER_WEEKS):
+    """逐行产出完整的日历（已折行，不含行尾换行符）"""
+    yield 'BEGIN:VCALENDAR'
+    yield 'VERSION:2.0'
+    yield f'PRODID:{PRODID}'
+    yield 'CALSCALE:GREGORIAN'
+    yield f'X-WR-CALNAME:{escape_text(name)}'
+    yield f'X-WR-TIMEZONE:{TZID}'
+    yield from VTIMEZONE
+    for line in iter_events(entries, week1, uid_prefix, max_week=max_week):
+        yield fold_line(line)
+    yield 'END:VCALENDAR'
+
+
+def write_calendar(path, entries, week1, name='课表', uid_prefix='', max_week=SEMESTER_WEEKS):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for line in iter_calendar(entries, week1, name, uid_prefix, max_week):
+            f.write(line + '\r\n')
+
+
+def load_schedule(username):
+    """从响应缓存读取课表和当前周，缓存过期或缺失时请求 studyapi"""
+    from cache import ResponseCache
+    from get_course import get_course_schedule, get_current_week
+
+    cache = ResponseCache()
+    course_data = cache.get_or_fetch('schedule', username, lambda: get_course_schedule(username))
+    current_week = cache.get_or_fetch('week', '', get_current_week)
+    return course_data, current_week
+
+
+def iter_jsonl(path):
+    """读取 bulk_export.py 的输出，跳过失败和不完整的记录"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and 'courses' in record:
+                yield record['username'], record['courses']
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'无效的日期: {value}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='把课表导出为 iCalendar (.ics) 文件')
+    parser.add_argument('username', nargs='?', help='学号，从缓存或 studyapi 读取课表')
+    parser.add_argument('--input', help='直接读取 getWeekClassSchedule 返回的 JSON 文件')
+    parser.add_argument('--jsonl', help='读取 bulk_export.py 的输出，为每个学号生成一个文件')
+    parser.add_argument('-o', '--output', help='输出文件；使用 --jsonl 时为输出目录')
+    parser.add_argument('--week1', type=parse_date, help='第1周星期一的日期（YYYY-MM-DD）')
+    parser.add_argument('--current-week', type=int, help='今天所在的周，用于推算第1周的日期')
+    parser.add_argument('--weeks', type=int, default=SEMESTER_WEEKS, help=f'导出的周数（默认 {SEMESTER_WEEKS}）')
+    args = parser.parse_args(argv)
+    if not (args.username or args.input or args.jsonl):
+        parser.error('需要提供学号、--input 或 --jsonl')
+
+    course_data, current_week = None, args.current_week
+    if args.username and not args.input and not args.jsonl:
+        course_data, fetched_week = load_schedule(args.username)
+        current_week = current_week or fetched_week
+    week1 = args.week1
+    if week1 is None:
+        if current_week is None:
+            parser.error('需要 --week1 或 --current-week 以确定日期')
+        week1 = week_start(1, int(current_week))
+
+    if args.jsonl:
+        directory = args.output or 'calendars'
+        os.makedirs(directory, exist_ok=True)
+        count = skipped = 0
+        for username, courses in iter_jsonl(args.jsonl):
+            if not isinstance(username, str) or not USERNAME_PATTERN.fullmatch(username):
+                print(f'跳过无效的学号: {username!r}', file=sys.stderr)
+                skipped += 1
+                continue
+            write_calendar(os.path.join(directory, f'{username}.ics'), courses, week1,
+                           name=f'{username} 课表', uid_prefix=f'{username}-', max_week=args.weeks)
+            count += 1
+        print(f'已导出 {count} 个日历到 {directory}' + (f'，跳过 {skipped} 个' if skipped else ''), file=sys.stderr)
+        return 0
+
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            course_data = json.load(f)
+    # 旧版缓存文件末尾带有记录用户名和更新时间的哨兵记录
+    entries = [normalize_entry(entry) for entry in course_data if 'c_name' in entry]
+    output = args.output or f'{args.username or "schedule"}.ics'
+    uid_prefix = f'{args.username}-' if args.username else ''
+    write_calendar(output, entries, week1, uid_prefix=uid_prefix, max_week=args.weeks)
+    print(f'已导出到 {output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+课表引擎：与 Kivy 无关的课表解析与索引。
+
+把 getWeekClassSchedule 返回的课程列表在数据加载时一次性解析为
+紧凑的数组索引（学期周 × 7 天 × 12 节 → 课次 id），切换周次时只需
+切片查表，脚本、测试和基准测试也可以直接导入使用。
+"""
+import datetime
+from array import array
+
+import tracing
+from weekmask import parse_rq, iter_weeks, format_weeks
+
+DAYS = ['星期一', '星期二', '星期三', '星期四', '星期五', '星期六', '星期日']
+DAYS_PER_WEEK = 7
+PERIODS_PER_DAY = 12
+CELLS_PER_WEEK = DAYS_PER_WEEK * PERIODS_PER_DAY
+SEMESTER_WEEKS = 20   # 界面中可选择的周数
+RQ_LENGTH = 53        # rq 字符串的长度（第0位不对应任何周）
+EMPTY = -1            # 索引中表示空单元格
+
+# 每一节课的 (开始, 结束) 时间
+PERIOD_TIMES = [
+    ('08:30', '09:15'), ('09:20', '10:05'), ('10:20', '11:05'), ('11:10', '11:55'),
+    ('14:30', '15:15'), ('15:20', '16:05'), ('16:20', '17:05'), ('17:10', '17:55'),
+    ('19:30', '20:15'), ('20:20', '21:05'), ('21:10', '21:55'), ('22:00', '22:45')
+]
+
+
+def normalize_course_name(name):
+    """统一课程名称中的空格和罗马数字等写法"""
+    return name.replace(' ', '').replace('Ⅱ', 'II').replace('Ⅰ', 'I').replace('Ⅲ', 'III').replace('–', '-')
+
+
+def clamp_week(week):
+    """把周次限制在界面可选择的 1 到 SEMESTER_WEEKS 之内（假期中接口可能返回 0 或更大的周）"""
+    return min(max(week, 1), SEMESTER_WEEKS)
+
+
+def advance_week(week, fetched_at, today=None):
+    """
+    由缓存的当前周推算今天所在的周：获取之后每跨过一个周一加一周。
+
+    结果不做限制，表头日期由它推算；界面显示的周另外用 clamp_week 限制。
+    """
+    today = today or datetime.date.today()
+    fetched = datetime.date.fromtimestamp(fetched_at)
+    monday_then = fetched - datetime.timedelta(days=fetched.weekday())
+    monday_now = today - datetime.timedelta(days=today.weekday())
+    return week + max(0, (monday_now - monday_then).days // 7)
+
+
+def week_start(week, current_week, today=None):
+    """以今天所在的周为第 current_week 周，推算第 week 周星期一的日期"""
+    today = today or datetime.date.today()
+    monday = today - datetime.timedelta(days=today.weekday())
+    return monday + datetime.timedelta(weeks=week - current_week)
+
+
+def wrap_text(text, width=4):
+    """按固定字数分行"""
+    return '\n'.join(text[i:i + width] for i in range(0, len(text), width))
+
+
+def normalize_entry(entry):
+    """把接口返回的一条上课记录整理为字段名固定、节次从 1 开始的字典"""
+    def to_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    name = normalize_course_name(entry.get('c_name', ''))
+    return {
+        'course': entry.get('course') or name,
+        'name': name,
+        'teacher': entry.get('teacher', ''),
+        'school': entry.get('school', ''),
+        'room': entry.get('room_name', ''),
+        'day': to_int(entry.get('xqj')),
+        'first_period': to_int(entry.get('ksjc')),
+        'last_period': to_int(entry.get('jsjc')),
+        'rq': entry.get('rq', '')
+    }
+
+
+def describe_course(course):
+    """生成课程详情弹窗中显示的文本"""
+    entry = course.entries[-1]
+    return (
+        f'地点: {entry.get("school", "")}{entry.get("room_name", "")}\n'
+        f'教师: {entry.get("teacher", "")}\n'
+        f'上课周: {format_weeks(course.weeks)}\n'
+    )
+
+
+class Course:
+    """一门课程，同一课程代码的多条上课记录共享一个 Course"""
+    __slots__ = ('id', 'key', 'name', 'entries', 'weeks')
+
+    def __init__(self, course_id, key, name):
+        self.id = course_id
+        self.key = key
+        self.name = name
+        self.entries = []  # 属于该课程的原始课程记录
+        self.weeks = 0     # 所有记录上课周的并集（位图）
+
+
+class Session:
+    """课次：同一课程在同一教室的上课安排，对应课表中显示的一种单元格内容"""
+    __slots__ = ('id', 'course_id', 'room', 'text')
+
+    def __init__(self, session_id, course_id, room, text):
+        self.id = session_id
+        self.course_id = course_id
+        self.room = room
+        self.text = text
+
+
+class ScheduleEngine:
+    """
+    课表索引。
+
+    索引是一个 array('h')，按 [周][星期][节次] 展平存放课次 id，
+    空单元格为 EMPTY。某一周的 84 个单元格是连续的一段，切换周次
+    只需取一次切片。
+    """
+
+    @tracing.traced('ScheduleEngine', 'parse')
+    def __init__(self, course_data, weeks=RQ_LENGTH):
+        self.weeks = weeks
+        self.courses = []    # 课程 id -> Course
+        self.sessions = []   # 课次 id -> Session
+        self._course_ids = {}
+        self._session_ids = {}
+        self.index = array('h', [EMPTY]) * (weeks * CELLS_PER_WEEK)
+        for entry in course_data:
+            self._add_entry(entry)
+        # 课程代码 -> 详情文本，点击单元格时直接查表
+        self.details = {course.key: describe_course(course) for course in self.courses}
+
+    def _add_entry(self, entry):
+        name = normalize_course_name(entry.get('c_name', ''))
+        key = entry.get('course') or name
+        course_id = self._course_ids.get(key)
+        if course_id is None:
+            course_id = len(self.courses)
+            self._course_ids[key] = course_id
+            self.courses.append(Course(course_id, key, name))
+        course = self.courses[course_id]
+        course.entries.append(entry)
+        weeks = parse_rq(entry.get('rq', ''))
+        course.weeks |= weeks
+
+        room = entry.get('room_name', '')
+        session_id = self._session_ids.get((course_id, room))
+        if session_id is None:
+            session_id = len(self.sessions)
+            self._session_ids[(course_id, room)] = session_id
+            text = wrap_text(name) + '\n \n' + wrap_text(room)
+            self.sessions.append(Session(session_id, course_id, room, text))
+
+        try:
+            day = int(entry['xqj']) - 1
+            first = int(entry['ksjc']) - 1
+            last = int(entry['jsjc']) - 1
+        except (KeyError, TypeError, ValueError):
+            # 缺少星期、节次或其值为 None 的记录只计入课程，不进入索引
+            return
+        if not 0 <= day < DAYS_PER_WEEK:
+            return
+        first = max(first, 0)
+        last = min(last, PERIODS_PER_DAY - 1)
+        for week in iter_weeks(weeks):
+            if week >= self.weeks:
+                break
+            base = week * CELLS_PER_WEEK + day * PERIODS_PER_DAY
+            for period in range(first, last + 1):
+                # 与原实现一致，后出现的记录覆盖先出现的记录
+                self.index[base + period] = session_id
+
+    def week_slice(self, week):
+        """返回指定周 84 个单元格的课次 id，按 [星期][节次] 排列"""
+        if not 0 <= week < self.weeks:
+            return array('h', [EMPTY]) * CELLS_PER_WEEK
+        start = week * CELLS_PER_WEEK
+        return self.index[start:start + CELLS_PER_WEEK]
+
+    def week_spans(self, week):
+        """
+        返回指定周 84 个单元格的跨越节数，同一天连续节次的相同课次合并为一块：
+        块的第一格为块的节数，被覆盖的格为 0，空单元格为 1。
+        """
+        cells = self.week_slice(week)
+        spans = array('b', [1]) * CELLS_PER_WEEK
+        for day_start in range(0, CELLS_PER_WEEK, PERIODS_PER_DAY):
+            head = day_start
+            for offset in range(day_start + 1, day_start + PERIODS_PER_DAY):
+                if cells[offset] != EMPTY and cells[offset] == cells[head]:
+                    spans[head] += 1
+                    spans[offset] = 0
+                else:
+                    head = offset
+        return spans
+
+    def course_by_key(self, key):
+        course_id = self._course_ids.get(key)
+        return None if course_id is None else self.courses[course_id]
@@ -0,0 +1,92 @@
+"""
+进程内的设置存储。
+
+credentials.json 只在第一次读取时解析，之后的读取都直接返回内存中的
+数据；只有文件的修改时间变化（例如被外部修改）时才重新加载。写入先
+更新内存，再在短暂延迟后合并成一次原子写入。
+"""
+import json
+import os
+import threading
+import time
+
+from cache import atomic_write_json
+
+FLUSH_DELAY = 0.5       # 合并写入的延迟（秒）
+CHECK_INTERVAL = 1.0    # 两次检查文件修改时间的最小间隔（秒）
+
+
+class SettingsStore:
+    def __init__(self, path, flush_delay=FLUSH_DELAY, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.flush_delay = flush_delay
+        self.check_interval = check_interval
+        self._data = {}
+        self._mtime = None
+        self._loaded = False
+        self._checked_at = 0
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self._loaded and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        mtime = self._stat_mtime()
+        if self._loaded and (mtime == self._mtime or self._dirty):
+            # 文件没变，或者内存中还有未写入的修改，以内存为准
+            return
+        data = {}
+        if mtime is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        self._data = data if isinstance(data, dict) else {}
+        self._mtime = mtime
+        self._loaded = True
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._reload_if_changed()
+            return self._data.get(key, default)
+
+    def all(self):
+        """返回全部设置的副本"""
+        with self._lock:
+            self._reload_if_changed()
+            return dict(self._data)
+
+    def update(self, values=None, **kwargs):
+        """更新内存中的设置，并安排一次合并写入"""
+        with self._lock:
+            self._reload_if_changed()
+            if values:
+                self._data.update(values)
+            self._data.update(kwargs)
+            self._dirty = True
+            if self._timer is None and self.flush_delay is not None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """立即写入尚未保存的修改"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            atomic_write_json(self.path, self._data, indent=4)
+            self._dirty = False
+            self._mtime = self._stat_mtime()
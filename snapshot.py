@@ -0,0 +1,250 @@
+"""
+课表的紧凑二进制快照。
+
+文件由四部分组成：
+
+    文件头 | 定长记录表 | 字符串表偏移 | 字符串数据
+
+每条上课记录是一个 64 字节的定长结构：常用的文本字段保存为字符串表
+中的序号（重复的教师、校区、节次等只存一份），rq 保存为整数位图，
+其余字段以 JSON 文本存入字符串表。字符串表可以整体用 zlib 压缩。
+
+读取时用 mmap 映射文件，记录在访问时才解码，启动时不需要解析整个文件。
+"""
+import json
+import mmap
+import re
+import struct
+import sys
+import zlib
+from collections.abc import Sequence
+
+from weekmask import parse_rq, to_rq
+
+MAGIC = b'MUSN'
+FORMAT_VERSION = 1
+FLAG_COMPRESSED = 1
+
+# 以字符串表序号保存的字段
+STRING_FIELDS = ('course', 'c_name', 'room_name', 'teacher', 't_name', 'school',
+                 'xkkh', 'kksd', 'xqj', 'ksjc', 'jsjc')
+NO_STRING = 0xFFFFFFFF   # 字段不存在
+
+RECORD_HAS_RQ = 1
+RECORD_HAS_DJZ = 2
+
+# 魔数、格式版本、标志、记录数、字符串数、字符串表存储大小、解压后大小、元数据序号
+HEADER = struct.Struct('<4sHHIIIII')
+# 各字符串字段序号、其余字段序号、rq 位图、djz、rq 长度、标志
+RECORD = struct.Struct(f'<{len(STRING_FIELDS)}IIQiBB2x')
+OFFSET = struct.Struct('<I')
+
+_RQ_PATTERN = re.compile(r'[01]{0,64}')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+class _StringTable:
+    def __init__(self):
+        self.index = {}
+        self.strings = []
+
+    def add(self, text):
+        i = self.index.get(text)
+        if i is None:
+            i = self.index[text] = len(self.strings)
+            self.strings.append(text)
+        return i
+
+    def encode(self):
+        blobs = [text.encode('utf-8') for text in self.strings]
+        offsets = bytearray()
+        position = 0
+        for blob in blobs:
+            offsets += OFFSET.pack(position)
+            position += len(blob)
+        offsets += OFFSET.pack(position)
+        return bytes(offsets) + b''.join(blobs)
+
+
+def _encode_record(entry, strings):
+    extras = dict(entry)
+    indices = []
+    for field in STRING_FIELDS:
+        value = extras.get(field)
+        if isinstance(value, str):
+            del extras[field]
+            indices.append(strings.add(value))
+        else:
+            # 缺失或不是字符串的值放到其余字段中原样保存
+            indices.append(NO_STRING)
+
+    flags, mask, rq_length, djz = 0, 0, 0, 0
+    rq = extras.get('rq')
+    if isinstance(rq, str) and _RQ_PATTERN.fullmatch(rq):
+        del extras['rq']
+        flags |= RECORD_HAS_RQ
+        mask, rq_length = parse_rq(rq), len(rq)
+    value = extras.get('djz')
+    if isinstance(value, int) and not isinstance(value, bool) and -2 ** 31 <= value < 2 ** 31:
+        del extras['djz']
+        flags |= RECORD_HAS_DJZ
+        djz = value
+
+    extras_index = strings.add(json.dumps(extras, ensure_ascii=False)) if extras else NO_STRING
+    return RECORD.pack(*indices, extras_index, mask, djz, rq_length, flags)
+
+
+def encode_snapshot(entries, meta=None, compress=False):
+    """把上课记录列表编码为快照字节串，meta 为随文件保存的任意 JSON 数据"""
+    strings = _StringTable()
+    records = b''.join(_encode_record(entry, strings) for entry in entries)
+    meta_index = strings.add(json.dumps(meta, ensure_ascii=False)) if meta is not None else NO_STRING
+    table = strings.encode()
+    stored = zlib.compress(table, 6) if compress else table
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, FLAG_COMPRESSED if compress else 0,
+                         len(records) // RECORD.size, len(strings.strings),
+                         len(stored), len(table), meta_index)
+    return header + records + stored
+
+
+def is_record_list(data):
+    """只有由字典组成的列表（例如课表）才能保存为快照"""
+    return isinstance(data, list) and all(isinstance(entry, dict) for entry in data)
+
+
+class Snapshot(Sequence):
+    """
+    只读的快照，按需解码的上课记录序列。
+
+    记录表直接从映射的文件中读取；字符串表在第一次读取字符串时整体
+    解码（压缩时先解压）一次。
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            try:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # 空文件无法映射
+                raise SnapshotError(f'{path}: empty file')
+        self._strings = None
+        try:
+            self._read_header(path)
+        except SnapshotError:
+            self.close()
+            raise
+
+    def _read_header(self, path):
+        if len(self._buffer) < HEADER.size:
+            raise SnapshotError(f'{path}: truncated header')
+        (magic, version, self._flags, self._count, self._string_count,
+         stored_size, self._table_size, self._meta_index) = HEADER.unpack_from(self._buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise SnapshotError(f'{path}: not a version {FORMAT_VERSION} snapshot')
+        self._table_offset = HEADER.size + self._count * RECORD.size
+        if len(self._buffer) != self._table_offset + stored_size:
+            raise SnapshotError(f'{path}: size mismatch')
+
+    def close(self):
+        self._strings = None
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _string_list(self):
+        """第一次读取字符串时一次性解码整个字符串表"""
+        if self._strings is None:
+            with memoryview(self._buffer) as view:
+                stored = view[self._table_offset:]
+                table = zlib.decompress(stored) if self._flags & FLAG_COMPRESSED else bytes(stored)
+                stored.release()
+            if len(table) != self._table_size:
+                raise SnapshotError('string table size mismatch')
+            count = self._string_count
+            offsets = struct.unpack_from(f'<{count + 1}I', table)
+            base = (count + 1) * OFFSET.size
+            self._strings = [str(table[base + offsets[i]:base + offsets[i + 1]], 'utf-8')
+                             for i in range(count)]
+        return self._strings
+
+    def string(self, i):
+        return self._string_list()[i]
+
+    @property
+    def meta(self):
+        if self._meta_index == NO_STRING:
+            return None
+        return json.loads(self.string(self._meta_index))
+
+    def _decode(self, values):
+        strings = self._string_list()
+        entry = {field: strings[index] for field, index in zip(STRING_FIELDS, values) if index != NO_STRING}
+        extras_index, mask, djz, rq_length, flags = values[len(STRING_FIELDS):]
+        if flags & RECORD_HAS_RQ:
+            entry['rq'] = to_rq(mask, rq_length)
+        if flags & RECORD_HAS_DJZ:
+            entry['djz'] = djz
+        if extras_index != NO_STRING:
+            entry.update(json.loads(strings[extras_index]))
+        return entry
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('snapshot record index out of range')
+        return self._decode(RECORD.unpack_from(self._buffer, HEADER.size + i * RECORD.size))
+
+    def __iter__(self):
+        # 顺序读取时一次取出整个记录表，逐条解码
+        records = self._buffer[HEADER.size:self._table_offset]
+        for values in RECORD.iter_unpack(records):
+            yield self._decode(values)
+
+    def to_list(self):
+        return list(self)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='在 JSON 与二进制快照之间转换课表')
+    sub = parser.add_subparsers(dest='command', required=True)
+    pack = sub.add_parser('pack', help='把 JSON 课表打包为快照')
+    pack.add_argument('input')
+    pack.add_argument('output')
+    pack.add_argument('--compress', action='store_true', help='用 zlib 压缩字符串表')
+    dump = sub.add_parser('dump', help='把快照还原为 JSON，便于调试')
+    dump.add_argument('input')
+    dump.add_argument('--indent', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    if args.command == 'pack':
+        with open(args.input, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not is_record_list(data):
+            parser.error('输入必须是由对象组成的 JSON 数组')
+        with open(args.output, 'wb') as f:
+            f.write(encode_snapshot(data, compress=args.compress))
+    else:
+        with Snapshot(args.input) as snapshot:
+            json.dump({'meta': snapshot.meta, 'data': snapshot.to_list()}, sys.stdout,
+                      ensure_ascii=False, indent=args.indent)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+后台任务执行器。
+
+网络和磁盘读写统一交给一个有界线程池执行，任务完成后的回调通过
+Kivy 的 Clock 派发回主线程，界面代码无需自己创建线程或加锁。
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 4
+
+
+def _clock_dispatch(callback):
+    """在下一帧由主线程执行 callback"""
+    from kivy.clock import Clock
+    Clock.schedule_once(lambda dt: callback())
+
+
+class Task:
+    """submit 返回的任务句柄，可查询结果或取消"""
+
+    def __init__(self, future):
+        self._future = future
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """
+        取消任务。
+
+        尚未开始的任务不会再执行；已经在运行的任务会继续跑完，
+        但不会再调用它的回调。
+        """
+        self._cancelled.set()
+        self._future.cancel()
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        return self._future.result(timeout)
+
+
+class TaskExecutor:
+    def __init__(self, max_workers=MAX_WORKERS, dispatch=None):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task')
+        self._dispatch = dispatch or _clock_dispatch
+
+    def submit(self, fn, *args, on_success=None, on_error=None, **kwargs):
+        """
+        在线程池中执行 fn(*args, **kwargs)。
+
+        成功时在主线程调用 on_success(结果)，抛出异常时调用 on_error(异常)；
+        任务被取消后两者都不会调用。
+        """
+        future = self._pool.submit(fn, *args, **kwargs)
+        task = Task(future)
+
+        def deliver(callback, value):
+            # 派发到主线程期间也可能被取消
+            if not task.cancelled():
+                callback(value)
+
+        def on_done(future):
+            if task.cancelled() or future.cancelled():
+                return
+            error = future.exception()
+            if error is None:
+                if on_success is not None:
+                    result = future.result()
+                    self._dispatch(lambda: deliver(on_success, result))
+            elif on_error is not None:
+                self._dispatch(lambda: deliver(on_error, error))
+
+        future.add_done_callback(on_done)
+        return task
+
+    def shutdown(self, wait=False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
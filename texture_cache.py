@@ -0,0 +1,60 @@
+"""
+文字纹理的 LRU 缓存。
+
+课表单元格的文字由 wrap_text 生成，在不同周、不同单元格之间大量重复。
+按 (文字, 字体, 字号, 排版区域, ...) 缓存已经光栅化的纹理，切换周次时
+相同内容直接复用，不再重新调用文字渲染。
+"""
+from collections import OrderedDict
+
+MAX_TEXTURES = 256
+
+
+class TextureCache:
+    def __init__(self, maxsize=MAX_TEXTURES):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._textures = OrderedDict()
+
+    def __len__(self):
+        return len(self._textures)
+
+    def get(self, key):
+        texture = self._textures.get(key)
+        if texture is None:
+            self.misses += 1
+            return None
+        self._textures.move_to_end(key)
+        self.hits += 1
+        return texture
+
+    def put(self, key, texture):
+        self._textures[key] = texture
+        self._textures.move_to_end(key)
+        while len(self._textures) > self.maxsize:
+            self._textures.popitem(last=False)
+
+    def get_or_render(self, key, render):
+        """命中时直接返回，否则调用 render() 生成纹理并缓存"""
+        texture = self.get(key)
+        if texture is None:
+            texture = render()
+            if texture is not None:
+                self.put(key, texture)
+        return texture
+
+    def clear(self):
+        self._textures.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._textures),
+            'maxsize': self.maxsize
+        }
+
+
+# 所有单元格和周次共享同一个缓存
+texture_cache = TextureCache()
@@ -0,0 +1,251 @@
+"""
+单控件批量渲染的课表网格。
+
+整张 8 × 13 的课表由一个控件绘制：每个单元格只是画布上的一组绘图
+指令，文字纹理按内容缓存复用；触摸位置通过算术换算为 (行, 列)，
+不再需要 104 个 Label 控件和各自的事件绑定。文字纹理与 BorderedLabel
+共用 texture_cache 中的 LRU 缓存。
+"""
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import Color, InstructionGroup, Line, Rectangle, RoundedRectangle
+from kivy.properties import ListProperty, NumericProperty, StringProperty
+from kivy.uix.widget import Widget
+from kivy.clock import Clock
+
+from texture_cache import texture_cache
+
+
+class GridCell:
+    """
+    网格中的一个单元格。
+
+    提供与 BorderedLabel 相同的 text / background_color / course_key / span
+    等属性，课表界面可以不区分两种渲染方式。修改属性只会标记该单元格待重绘。
+    """
+    __slots__ = ('grid', 'row', 'col', 'markup', 'course_key', 'initial_background_color',
+                 '_text', '_background_color', '_span', 'group', 'color_base', 'rect_base',
+                 'rect_shadow', 'rect_gradient', 'color_text', 'rect_text')
+
+    def __init__(self, grid, row, col, text, background_color, markup=False):
+        self.grid = grid
+        self.row = row
+        self.col = col
+        self.markup = markup
+        self.course_key = None
+        self.initial_background_color = background_color
+        self._text = text
+        self._background_color = background_color
+        self._span = 1
+
+        self.group = InstructionGroup()
+        self.color_base = Color(*background_color)
+        self.rect_base = RoundedRectangle(radius=[10])
+        self.rect_shadow = RoundedRectangle(radius=[10])
+        self.rect_gradient = RoundedRectangle(radius=[10])
+        self.color_text = Color(*grid.text_color)
+        self.rect_text = Rectangle()
+        for instruction in (self.color_base, self.rect_base,
+                            Color(0, 0, 0, 0.1), self.rect_shadow,
+                            Color(1, 1, 1, 0.2), self.rect_gradient,
+                            self.color_text, self.rect_text):
+            self.group.add(instruction)
+
+    @property
+    def text(self):
+        return self._text
+
+    @text.setter
+    def text(self, value):
+        if value != self._text:
+            self._text = value
+            self.grid.mark_dirty(self)
+
+    @property
+    def background_color(self):
+        return self._background_color
+
+    @background_color.setter
+    def background_color(self, value):
+        if value != self._background_color:
+            self._background_color = value
+            self.color_base.rgba = value
+
+    @property
+    def span(self):
+        return self._span
+
+    @span.setter
+    def span(self, value):
+        if value != self._span:
+            self._span = value
+            self.grid.mark_dirty(self)
+
+
+class TimetableGrid(Widget):
+    cols = NumericProperty(8)
+    rows = NumericProperty(13)
+    padding = NumericProperty(10)
+    spacing = NumericProperty(2)
+    cell_height = NumericProperty(100)
+    font_size = NumericProperty(15)
+    font_name = StringProperty('Roboto')
+    text_color = ListProperty([0, 0, 0, 1])
+
+    __events__ = ('on_cell_press',)
+
+    def __init__(self, headers, row_labels, background_color, **kwargs):
+        super(TimetableGrid, self).__init__(**kwargs)
+        self._dirty = set()
+        self._pressed = None
+        self._trigger_layout = Clock.create_trigger(self.do_layout)
+        self._trigger_redraw = Clock.create_trigger(self.redraw)
+
+        self.cells = []
+        for row in range(self.rows):
+            cells = []
+            for col in range(self.cols):
+                if row == 0:
+                    text, markup = f'[b]{headers[col]}[/b]', True
+                elif col == 0:
+                    text, markup = row_labels[row - 1], False
+                else:
+                    text, markup = '', False
+                cell = GridCell(self, row, col, text, background_color, markup)
+                self.canvas.add(cell.group)
+                cells.append(cell)
+            self.cells.append(cells)
+        self.header_cells = self.cells[0]
+
+        # 表头下边框、时间列右边框以及上午/下午/晚上分隔线
+        self.canvas.add(Color(0, 0, 0, 1))
+        self.header_border = Line(width=2)
+        self.time_border = Line(width=2)
+        self.canvas.add(self.header_border)
+        self.canvas.add(self.time_border)
+        self.canvas.add(Color(0.8, 0.8, 0.8, 1))
+        self.separators = [Line(width=1.5) for _ in (4, 8)]
+        for line in self.separators:
+            self.canvas.add(line)
+
+        self.bind(pos=self._trigger_layout, size=self._trigger_layout,
+                  cell_height=self._trigger_layout, font_size=self._trigger_layout)
+        self.bind(cell_height=self._update_height, padding=self._update_height, spacing=self._update_height)
+        self._update_height()
+        self._trigger_layout()
+
+    def _update_height(self, *args):
+        self.height = self.rows * self.cell_height + (self.rows - 1) * self.spacing + 2 * self.padding
+
+    @property
+    def cell_width(self):
+        return (self.width - 2 * self.padding - (self.cols - 1) * self.spacing) / self.cols
+
+    def cell(self, day_index, period_index):
+        """按星期（0-6）和节次（0-11）取课程单元格"""
+        return self.cells[period_index + 1][day_index + 1]
+
+    def cell_rect(self, row, col, span=1):
+        """单元格（或向下跨越 span 行的合并块）左下角坐标和大小，第0行在最上方"""
+        w, h = self.cell_width, self.cell_height
+        height = span * h + (span - 1) * self.spacing
+        x = self.x + self.padding + col * (w + self.spacing)
+        y = self.top - self.padding - row * (h + self.spacing) - height
+        return x, y, w, height
+
+    def cell_at(self, x, y):
+        """把坐标换算为单元格，落在间隙或边距上时返回 None"""
+        w, h = self.cell_width, self.cell_height
+        col, dx = divmod(x - self.x - self.padding, w + self.spacing)
+        row, dy = divmod(self.top - self.padding - y, h + self.spacing)
+        if not (0 <= col < self.cols and 0 <= row < self.rows) or dx > w:
+            return None
+        row, col = int(row), int(col)
+        # 被合并块覆盖的单元格归属于块的第一行
+        head = row
+        while head > 0 and self.cells[head][col].span == 0:
+            head -= 1
+        cell = self.cells[head][col]
+        # 块内部的行间隙也属于该块，只有块最后一行下方的间隙不算
+        if row == head + cell.span - 1 and dy > h:
+            return None
+        return cell
+
+    def mark_dirty(self, cell):
+        self._dirty.add(cell)
+        self._trigger_redraw()
+
+    def do_layout(self, *args):
+        for cells in self.cells:
+            self._dirty.update(cells)
+
+        left, right = self.x + self.padding, self.right - self.padding
+        bottom, top = self.y + self.padding, self.top - self.padding
+        x, y, w, h = self.cell_rect(0, 0)
+        self.header_border.points = [left, y, right, y]
+        self.time_border.points = [x + w, bottom, x + w, top]
+        for line, row in zip(self.separators, (4, 8)):
+            y = self.cell_rect(row, 0)[1]
+            line.points = [left, y, right, y]
+        self.redraw()
+
+    def redraw(self, *args):
+        """只重新摆放有变化的单元格并生成它们的文字"""
+        dirty, self._dirty = self._dirty, set()
+        for cell in dirty:
+            if cell.span > 0:
+                x, y, w, h = self.cell_rect(cell.row, cell.col, cell.span)
+            else:
+                # 被合并块覆盖，不绘制
+                x, y, w, h = self.x, self.top, 0, 0
+            cell.rect_base.pos = (x, y)
+            cell.rect_base.size = (w, h)
+            cell.rect_shadow.pos = (x, y - 2)
+            cell.rect_shadow.size = (w, h)
+            cell.rect_gradient.pos = (x, y)
+            cell.rect_gradient.size = (w, h)
+            texture = self.get_texture(cell.text, w, cell.markup) if h else None
+            if texture is None:
+                cell.rect_text.texture = None
+                cell.rect_text.size = (0, 0)
+                continue
+            tw, th = texture.size
+            cell.rect_text.texture = texture
+            cell.rect_text.size = (tw, th)
+            cell.rect_text.pos = (int(x + (w - tw) / 2), int(y + (h - th) / 2))
+
+    def get_texture(self, text, width, markup=False):
+        if not text:
+            return None
+        text_size = (max(int(width) - 4, 1), None)
+        key = (text, self.font_name, self.font_size, text_size, markup, 'center', 'middle')
+
+        def render():
+            label = CoreLabel(text=text, font_name=self.font_name, font_size=self.font_size,
+                              halign='center', valign='middle', markup=markup, text_size=text_size)
+            label.refresh()
+            return label.texture
+
+        return texture_cache.get_or_render(key, render)
+
+    def on_touch_down(self, touch):
+        if not self.collide_point(*touch.pos):
+            return False
+        cell = self.cell_at(*touch.pos)
+        if cell is None or cell.course_key is None:
+            return False
+        # 与按钮一样抓取触摸，在同一单元格松开时才算点击
+        self._pressed = cell
+        touch.grab(self)
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super(TimetableGrid, self).on_touch_up(touch)
+        touch.ungrab(self)
+        cell, self._pressed = self._pressed, None
+        if cell is not None and self.collide_point(*touch.pos) and self.cell_at(*touch.pos) is cell:
+            self.dispatch('on_cell_press', cell)
+        return True
+
+    def on_cell_press(self, cell):
+        pass
@@ -0,0 +1,84 @@
+"""
+上课周位图。
+
+getWeekClassSchedule 返回的 rq 是形如 '0111100...' 的 53 位字符串，
+第 i 个字符为 '1' 表示第 i 周有课。这里把它解析为整数位图（第 i 位
+对应第 i 周），合并、计数、判断某周是否有课以及生成“第x-y周”文本
+都只需要位运算。
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+RQ_PATTERN = re.compile('[01]*')
+
+
+def parse_rq(rq):
+    """把 rq 字符串解析为整数位图，缺失或格式不对时记录日志并当作没有课"""
+    if rq is None or rq == '':
+        return 0
+    if not isinstance(rq, str) or not RQ_PATTERN.fullmatch(rq):
+        logger.warning('ignoring malformed rq: %r', rq)
+        return 0
+    # 反转后第 i 个字符落在第 i 位
+    return int(rq[::-1], 2)
+
+
+def to_rq(mask, length=53):
+    """把位图还原为 rq 字符串"""
+    return format(mask, f'0{length}b')[::-1][:length]
+
+
+def union(*masks):
+    """合并多个位图"""
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
+
+
+def has_week(mask, week):
+    """判断第 week 周是否有课"""
+    return week >= 0 and (mask >> week) & 1 == 1
+
+
+def popcount(mask):
+    """有课的周数"""
+    return bin(mask).count('1')
+
+
+def iter_weeks(mask):
+    """按从小到大的顺序产出所有有课的周"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def week_runs(mask):
+    """
+    提取连续有课的周区间。
+
+    返回 [(起始周, 结束周), ...]，复杂度与区间个数成正比。
+    """
+    runs = []
+    while mask:
+        start = (mask & -mask).bit_length() - 1
+        shifted = mask >> start
+        # shifted 末尾连续 1 的个数即区间长度
+        length = ((shifted + 1) & ~shifted).bit_length() - 1
+        runs.append((start, start + length - 1))
+        mask &= ~(((1 << length) - 1) << start)
+    return runs
+
+
+def format_weeks(mask):
+    """生成“第1-15周”“第7周”“第1-3周,第5-8周”形式的文本"""
+    parts = []
+    for start, end in week_runs(mask):
+        if start == end:
+            parts.append(f'第{start}周')
+        else:
+            parts.append(f'第{start}-{end}周')
+    return ','.join(parts)